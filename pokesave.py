@@ -5,6 +5,7 @@
 author: David "SuperSalsa" Keaton
 
 usage: pokesave.py <filename>.sav
+       pokesave.py {inspect,validate,fix-checksums,dump} <file> [<file> ...]
 
 PokeSave is a save-game editor for Pokemon Silver/Gold.
     This script will open a save game file for Gen II,
@@ -31,20 +32,30 @@ TODO:
         + finish CURSES term UI
         + ASCII art display on Windoze term w/o Cygwin
     x compute primary and secondary checksums
-    - assure sync of edited byte stream back to file
+    x assure sync of edited byte stream back to file
     x create proprietary string encoding algorithms
     - control stream & file position
     ! associate strings in save data with str_* functions
-    - allow user to change filename (no static `POKEGOLD.SAV')
+    x allow user to change filename (no static `POKEGOLD.SAV')
     - add bitfields for save['options']
-    - add parser/editor for POKEMON_* struct        (allow edit PokeManz)
+    ! add parser/editor for POKEMON_* struct        (allow edit PokeManz)
     - add parser/editor for POKEMON_BOX_* struct    (allow edit PokeManz)
     - add parser/editor for items, TMs, pokeballs, key items, etc
 
     < some other stuff I'm sure I need to add to this list > :D
 """
 
-import io, sys, curses, curses.ascii
+import io, os, sys, time, mmap, json, bisect, random, struct, hashlib
+import signal, socket, cProfile, tempfile, contextlib, tracemalloc
+import types, asyncio, argparse, threading, itertools, collections
+import concurrent.futures
+import curses, curses.ascii
+
+try:
+    # only needed for the batch (`*_batch') functions
+    import numpy as np
+except ImportError:
+    np = None
 
 # [DATA] {{{1
 
@@ -65,12 +76,17 @@ NAME_SIZE           = 11    # total bytes for name
 REAL_NAME_SIZE      = 7     # available bytes for name
 # size of the seen/owned pokedex entries
 POKEDEX_SIZE        = 32
+POKEDEX_COUNT       = 251       # species (bits) actually used
 # size of pokemon structure
-POKEMON_SIZE        = 0x48      # XXX: MAKE SURE THIS # IS CORRECT!
+POKEMON_SIZE        = 0x30
+# size of pokemon structure in BILL's PC (the first 0x20 bytes of the above)
+BOXMON_SIZE         = 0x20
 # size of the player's pokemon party
-POKEPARTY_SIZE      = 428       # possibly [432], since     (432 / 0x48) == 6
+POKEPARTY_SIZE      = 428       # 1 + 7 + (6 * 0x30) + (2 * 6 * 11)
 # size of player's money
 MONEY_SIZE          = 3
+# most money the game lets you carry
+MONEY_MAX           = 999999
 # size of bag pockets
 TM_POCKET_SIZE      = 57
 ITEM_POCKET_SIZE    = 42
@@ -81,8 +97,23 @@ PC_ITEM_SIZE        = 102
 PC_NAME_SIZE        = 126
 # size of each box in BILL's PC
 POKEBOX_SIZE        = 1102      # TODO: xlat into formula
+# size of a whole save (the cartridge's 32K of SRAM)
+SAVE_SIZE           = 0x8000
 # size of the checksum field
 CHECKSUM_SIZE       = 2
+# smallest chunk a snapshot is cut into (see `snapshot_chunks()')
+SNAPSHOT_CHUNK      = 256
+# pokemon lists: count, species list, pokemon, OT names, nicknames
+PARTY_MAX           = 6         # pokemon in the party
+BOX_MAX             = 20        # pokemon in each box
+# number of boxes in BILL's PC, and the size of each box's name
+PC_BOX_COUNT        = 14
+BOX_NAME_SIZE       = 9
+
+# commit journal: file suffix, header, and (start, length) of each range
+JOURNAL_EXT         = ".journal"
+JOURNAL_MAGIC       = b"PKSJ"
+JOURNAL_RANGE       = struct.Struct('<II')
 
 # End Of Name (string terminator)
 EON = 0x50
@@ -112,6 +143,17 @@ TYPE_POKEMON    = 1     # pokemon data
 TYPE_POKEBOX    = 2     # pokemon-in-PC-box data
 TYPE_POKELIST   = 3     # pokemon list (i.e. party pokemon)
 TYPE_STRING     = 4     # encoded string (non-name related)
+TYPE_RAW        = 5     # raw bytes, nothing fancy
+TYPE_OPTIONS    = 6     # options bitfield
+TYPE_ID         = 7     # 2 byte big-endian ID
+TYPE_BYTE       = 8     # single byte value
+TYPE_TIME       = 9     # time played (hours, minutes, seconds)
+TYPE_MONEY      = 10    # 3 byte big-endian money
+TYPE_BADGES     = 11    # badge bitfield
+TYPE_POCKET     = 12    # item list (bag pockets, PC items)
+TYPE_POKEDEX    = 13    # pokedex bitfield
+TYPE_BOXNAMES   = 14    # names of the boxes in BILL's PC
+TYPE_CHECKSUM   = 15    # 2 byte little-endian checksum
 
 # TODO: tm/hm list
 
@@ -137,9 +179,25 @@ TIME_FRAME      = 1.0 / 60.0
 # }}}2
 
 # [POKEMON] {{{2
-# TODO: finish this struct
+# field => (offset, struct format)      (big-endian, see `Pokemon')
+# the first BOXMON_SIZE bytes are the same for pokemon in BILL's PC
 pokemon = {
-        'species': 0x00,
+        'species':      (0x00, 'B'),
+        'item':         (0x01, 'B'),    # held item
+        'moves':        (0x02, '4B'),
+        'ot_id':        (0x06, 'H'),
+        'exp':          (0x08, '3s'),   # 24-bit
+        'stat_exp':     (0x0B, '5H'),   # HP, Atk, Def, Spd, Spc
+        'dvs':          (0x15, 'H'),
+        'pp':           (0x17, '4B'),
+        'friendship':   (0x1B, 'B'),
+        'pokerus':      (0x1C, 'B'),
+        'caught':       (0x1D, 'H'),
+        'level':        (0x1F, 'B'),
+# party pokemon only
+        'status':       (0x20, 'B'),
+        'hp':           (0x22, 'H'),
+        'stats':        (0x24, '6H'),   # max HP, Atk, Def, Spd, SpA, SpD
 } #}}}2
 
 # [SAVE] {{{2
@@ -148,120 +206,140 @@ save = {}
 save['options'] = {
         'addr': 0x2000,
         'size': OPTIONS_SIZE,
+        'type': TYPE_OPTIONS,
         'val' : list()
 }
 # Trainer ID
 save['trainer_id'] = {
         'addr': 0x2009,
         'size': ID_SIZE,
+        'type': TYPE_ID,
         'val' : list()
 }
 # player's name
 save['player_name'] = {
         'addr': 0x200b,
         'size': NAME_SIZE,
+        'type': TYPE_NAME,
         'val' : list()     # uses str_encode/str_decode
 }
 # rival's name
 save['rival_name'] = {
         'addr': 0x2021,
         'size': NAME_SIZE,
+        'type': TYPE_NAME,
         'val' : list()     # uses str_encode/str_decode
 }
 # daylight savings
 save['dst'] = {
         'addr': 0x2037,
         'size': 1,
+        'type': TYPE_BYTE,
         'val' : list()
 }
 # time played
 save['time_played'] = {
         'addr': 0x2053,
         'size': 4,
+        'type': TYPE_TIME,
         'val' : list()
 }
 # player's sprite palette (?)
 save['player_palette'] = {
         'addr': 0x206b,
         'size': 1,
+        'type': TYPE_BYTE,
         'val' : list()
 }
 # $$$ DOLLA DOLLA BILLS Y'ALL $$$
 save['money'] = {
         'addr': 0x23db,
         'size': MONEY_SIZE,
+        'type': TYPE_MONEY,
         'val' : list()
 }
 # amount of badges earned in Johto
 save['johto_badges'] = {
         'addr': 0x23e4,
         'size': 1,
+        'type': TYPE_BADGES,
         'val' : list()
 }
 # TMs in bag pocket
 save['tm_pocket'] = {
         'addr': 0x23e6,
         'size': TM_POCKET_SIZE,
+        'type': TYPE_POCKET,
         'val' : list()
 }
 # items in bag pocket
 save['item_pocket'] = {
         'addr': 0x241f,
         'size': ITEM_POCKET_SIZE,
+        'type': TYPE_POCKET,
         'val' : list()
 }
 # key items in bag pocket
 save['key_item_pocket'] = {
         'addr': 0x2449,
         'size': KEY_POCKET_SIZE,
+        'type': TYPE_POCKET,
         'val' : list()
 }
 # PokeBalls (TM) in bag pocket
 save['ball_pocket'] = {
         'addr': 0x2464,
         'size': BALL_POCKET_SIZE,
+        'type': TYPE_POCKET,
         'val' : list()
 }
 # PC stored items
 save['pc_items'] = {
         'addr': 0x247e,
         'size': PC_ITEM_SIZE,
+        'type': TYPE_POCKET,
         'val' : list()
 }
 # current PC box number
 save['pc_box_current'] = {
         'addr': 0x2724,
         'size': 1,
+        'type': TYPE_BYTE,
         'val' : list()
 }
 # names of PC boxen
 save['pc_box_names'] = {
         'addr': 0x2727,
         'size': PC_NAME_SIZE,
+        'type': TYPE_BOXNAMES,
         'val' : list()
 }
 # party pokemon     (see POKEMON_* struct)
 save['pokemon_party'] = {
         'addr': 0x288a,
         'size': POKEPARTY_SIZE,
+        'type': TYPE_POKELIST,
         'val' : list()
 }
 # PokeDex (TM) entries owned
 save['pokedex_owned'] = {
         'addr': 0x2a4c,
         'size': POKEDEX_SIZE,
+        'type': TYPE_POKEDEX,
         'val' : list()
 }
 # PokeDex (TM) entries seen
 save['pokedex_seen'] = {
         'addr': 0x2a6c,
         'size': POKEDEX_SIZE,
+        'type': TYPE_POKEDEX,
         'val' : list()
 }
 # pokemon in BILL's PC (current box)        (see POKEMON_BOX_* struct)
 save['pokemon_cur_box'] = {
         'addr': 0x2d6c,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # ------------------
@@ -273,84 +351,98 @@ save['pokemon_cur_box'] = {
 save['pokemon_box_1'] = {
         'addr': 0x4000,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 2
 save['pokemon_box_2'] = {
         'addr': 0x4450,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 3
 save['pokemon_box_3'] = {
         'addr': 0x48a0,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 4
 save['pokemon_box_4'] = {
         'addr': 0x4cf0,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 5
 save['pokemon_box_5'] = {
         'addr': 0x5140,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 6
 save['pokemon_box_6'] = {
         'addr': 0x5590,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 7
 save['pokemon_box_7'] = {
         'addr': 0x59e0,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 8
 save['pokemon_box_8'] = {
         'addr': 0x6000,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 9
 save['pokemon_box_9'] = {
         'addr': 0x6450,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 10
 save['pokemon_box_10'] = {
         'addr': 0x68a0,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 11
 save['pokemon_box_11'] = {
         'addr': 0x6cf0,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 12
 save['pokemon_box_12'] = {
         'addr': 0x7140,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 13
 save['pokemon_box_13'] = {
         'addr': 0x7590,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 # Box 14
 save['pokemon_box_14'] = {
         'addr': 0x79e0,
         'size': POKEBOX_SIZE,
+        'type': TYPE_POKEBOX,
         'val' : list()
 }
 save['checksum'] = ({
@@ -360,6 +452,7 @@ save['checksum'] = ({
             {'start': 0x2009, 'end': 0x2d68},
         ),
         'size':     CHECKSUM_SIZE,
+        'type':     TYPE_CHECKSUM,
         'val':      list(),
     },{
 # Checksum 2    (secondary save)
@@ -371,9 +464,133 @@ save['checksum'] = ({
             {'start': 0x7e39, 'end': 0x7e6c},
         ),
         'size':     CHECKSUM_SIZE,
+        'type':     TYPE_CHECKSUM,
         'val':      list(),
 },) # }}}2
 
+# [SCHEMA] {{{2
+# `struct' formats for the field types that have one
+type_formats = {
+        TYPE_ID:        '>H',
+        TYPE_BYTE:      'B',
+        TYPE_BADGES:    'B',
+        TYPE_TIME:      '>HBB',
+        TYPE_CHECKSUM:  '<H',
+}
+
+"""
+Field(name, index, addr, size, end, type, st)
+
+One field of the save layout, compiled by `compile_schema()'.
+    `st' is its precompiled `struct.Struct' (or None if it has none).
+"""
+class Field(collections.namedtuple('Field', 'name index addr size end '
+                                            'type st')): # {{{3
+    __slots__ = ()
+
+    def view(self, buf):
+        return memoryview(buf)[self.addr:self.end]
+
+    def unpack(self, buf):
+        return self.st.unpack_from(buf, self.addr)
+# }}}3
+
+"""
+Schema(fields)
+    fields  := `Field's, in layout order
+
+An immutable, compiled version of `save': name <=> index <=> offset in
+    O(1) (O(log n) for offsets that fall inside a field), with each
+    field's type spelled out instead of guessed from its size.
+
+        schema['money'].addr        schema[7].name
+        schema.index('money')       schema.at(0x23dc).name
+        schema.within(0x2000, 0x2010)
+
+The checksum words come last, as 'checksum[N]'.
+"""
+class Schema: # {{{3
+    __slots__ = ('fields', 'names', 'starts', 'width')
+
+    def __init__(self, fields):
+        object.__setattr__(self, 'fields', tuple(fields))
+        object.__setattr__(self, 'names', types.MappingProxyType(
+                           {f.name: f for f in self.fields}))
+        # (addr, index) sorted, for `at()'
+        object.__setattr__(self, 'starts', tuple(sorted(
+                           (f.addr, f.index) for f in self.fields)))
+        # longest label, for lining values up
+        object.__setattr__(self, 'width', max(len(f.name)
+                                              for f in self.fields))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("schema is read-only")
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self.fields[key]
+        return self.names[key]
+
+    def __contains__(self, key):
+        return key in self.names
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def index(self, name):
+        return self.names[name].index
+
+    def key(self, index):
+        return self.fields[index].name
+
+    def at(self, addr):
+        # the field holding `addr', if any
+        i = bisect.bisect_right(self.starts, (addr, len(self.fields))) - 1
+        if i < 0:
+            return None
+        f = self.fields[self.starts[i][1]]
+        return f if addr < f.end else None
+
+    def within(self, start, end):
+        # every field overlapping [start, end)
+        i = max(bisect.bisect_right(self.starts,
+                                    (start, len(self.fields))) - 1, 0)
+        out = list()
+        for addr, index in self.starts[i:]:
+            if addr >= end:
+                break
+            f = self.fields[index]
+            if f.end > start:
+                out.append(f)
+        return out
+# }}}3
+
+"""
+compile_schema(layout)
+    layout  := dict-of-dicts like `save'
+
+returns:    a `Schema' of every field in `layout'
+"""
+def compile_schema(layout): # {{{3
+    fields = list()
+    def add(name, f):
+        fmt = type_formats.get(f['type'])
+        fields.append(Field(name, len(fields), f['addr'], f['size'],
+                            f['addr'] + f['size'], f['type'],
+                            struct.Struct(fmt) if fmt else None))
+    for k, f in layout.items():
+        if k != 'checksum':
+            add(k, f)
+    for i, f in enumerate(layout.get('checksum', ())):
+        add('checksum[{}]'.format(i), f)
+    return Schema(fields)
+# }}}3
+schema = compile_schema(save)
+# }}}2
+
 # [FILE/STREAM] {{{2
 # positions and addresses for current stream cursor, base/offset, etc
 pos = {
@@ -408,6 +625,7 @@ special_char = { # {{{3
         0x00: '?',
 
         # spaces
+        0x7F: ' ',
         0xBA: ' ',
         0xBB: ' ',
         0xBC: ' ',
@@ -453,6 +671,7 @@ special_char = { # {{{3
         0xD6: '\'v',
         #0xDF: '←', # only in crystal
 
+        0xE0: '\'',
         0xE1: 'PK',
         0xE2: 'MN',
         0xE3: '-',
@@ -471,6 +690,52 @@ special_char = { # {{{3
         0xF3: '/',
         0xF5: '♀',
 } # }}}3
+
+# [CODEC] {{{3
+# unknown PKMN chars decode to this
+UNKNOWN_CHAR    = '~'
+# PKMN byte => text, all 256 of them      (see `str_decode()')
+decode_table    = [UNKNOWN_CHAR] * 256
+# text => PKMN byte                       (see `str_encode()')
+encode_table    = dict()
+# longest text any one PKMN byte turns into (i.e. 'PK', "'s")
+ENCODE_MAX      = 1
+def build_codec(): # {{{4
+    global ENCODE_MAX
+    # UPPER, lower and numbers are contiguous runs
+    for base, first, count in ((0x80, 'A', 26), (0xA0, 'a', 26),
+                               (0xF6, '0', 10)):
+        for i in range(0, count):
+            decode_table[base + i] = chr(ord(first) + i)
+            encode_table[chr(ord(first) + i)] = base + i
+    # the rest come from the lookup table; first entry for a glyph wins
+    # when encoding, so ' ' => 0x7F and '?' => 0xE6 (0x00 terminates)
+    for c, text in special_char.items():
+        decode_table[c] = text
+        # tab is just a run of spaces, don't eat those
+        if c == 0x00 or c == 0x60:
+            continue
+        # tiles that are just letters (PO, Ké, PK, MN) are never used for
+        # encoding: spelled out, so POLIWAG doesn't start with the PO tile
+        if len(text) > 1 and text.isalnum():
+            continue
+        encode_table.setdefault(text, c)
+    # NOTE: `ascii_hex' holds ASCII codes, not PKMN ones, so it has no
+    #       business in here ('_' would come out as 0x5F, i.e. '~')
+    ENCODE_MAX = max(len(text) for text in encode_table.keys())
+    return
+# }}}4
+build_codec()
+# }}}3
+# }}}2
+
+# [PROFILING] {{{2
+# called with every phase record (see `phase()')
+hooks = list()
+# phases running right now, innermost last (each thread has its own)
+running = threading.local()
+# bytes read from (or mapped) / written to save files so far
+io_stats = {'read': 0, 'written': 0}
 # }}}2
 
 # [UI] {{{2
@@ -486,6 +751,7 @@ window = None
 # UI mode constants
 MODE_DISPLAY    = 0
 MODE_EDIT       = 1
+MODE_HEX        = 2
 # current viewport details
 view = {
         'mode':     MODE_DISPLAY, # current UI MODE_
@@ -498,7 +764,28 @@ view = {
         'right':    0,  # right-most column displayed
         'height':   0,  # height of the curses window
         'width':    0,  # width of the curses window
+        'tabstop':  0,  # column the values line up after
+        'prompt':   None, # text typed at the goto prompt (if it's up)
 }
+# one-line window along the bottom for messages (see `set_status()')
+statusbar = None
+# pad backing the virtual list of rows (see `prep_display()')
+pad = None
+# most rendered values kept around (see `RenderCache')
+RENDER_CACHE_SIZE = 256
+# bytes per line of the hex view
+HEX_WIDTH = 16
+# most hex lines kept around (see `hex_line()')
+HEX_CACHE_SIZE = 1024
+# one column per byte for the hex view's text, '.' if it has no (single,
+# plain) glyph or just ends a string
+hex_glyphs = [t if len(t) == 1 and ' ' <= t < '\x7f' and t != UNKNOWN_CHAR
+              and c not in (0x00, EON) else '.'
+              for c, t in enumerate(decode_table)]
+# rows of the list: (label, function returning the value text)
+rows = list()
+# what is drawn on each pad line: line => (value text, selected?)
+drawn = dict()
 # sub-window details (more-or-less a clone of `view')
 subview = {
         'y':        0,  # current y position
@@ -510,16 +797,8 @@ subview = {
         'height':   0,  # height of the curses window
         'width':    0,  # width of the curses window
 }
-# escape sequences
-ESC_SEQ = {
-        # arrows
-        'UP':       (91, 65,),
-        'LEFT':     (91, 68,),
-        'DOWN':     (91, 66,),
-        'RIGHT':    (91, 67,),
-        # Fn
-        'F10':      (91, 50,),
-}
+# how long (ms) to wait after ESC before deciding it was just ESC
+ESC_DELAY = 25
 # key types
 KEY_TYPE_TEXT   = 0 # ([A-Za-z0-9]|[?!.,-'"@$])
 KEY_TYPE_MOVE   = 1 # ^ v < >
@@ -529,12 +808,47 @@ KEY_UP          = 0
 KEY_LEFT        = 1
 KEY_DOWN        = 2
 KEY_RIGHT       = 3
+KEY_PGUP        = 4
+KEY_PGDN        = 5
+KEY_HOME        = 6
+KEY_END         = 7
 # key control codes
 KEY_NONE        = 0 # special: "continue processing"
 KEY_HALT        = 1 # special: "stop processing"
 KEY_ENTER       = 2 # change MODE_ values || write new data value
 KEY_ESCAPE      = 3 # go back a screen
 KEY_QUIT        = 4 # quit the program
+KEY_HEX         = 5 # flip between the fields and the hex view
+KEY_ERASE       = 6 # backspace
+# curses key code => (KEY_TYPE_, key code), keypad() decodes the escape
+# sequences for us (using terminfo), so arrows and Fn are just numbers
+KEY_MAP = {
+        # arrows
+        curses.KEY_UP:          (KEY_TYPE_MOVE, KEY_UP),
+        curses.KEY_LEFT:        (KEY_TYPE_MOVE, KEY_LEFT),
+        curses.KEY_DOWN:        (KEY_TYPE_MOVE, KEY_DOWN),
+        curses.KEY_RIGHT:       (KEY_TYPE_MOVE, KEY_RIGHT),
+        # paging
+        curses.KEY_PPAGE:       (KEY_TYPE_MOVE, KEY_PGUP),
+        curses.KEY_NPAGE:       (KEY_TYPE_MOVE, KEY_PGDN),
+        curses.KEY_HOME:        (KEY_TYPE_MOVE, KEY_HOME),
+        curses.KEY_END:         (KEY_TYPE_MOVE, KEY_END),
+        # Fn
+        curses.KEY_F2:          (KEY_TYPE_CTRL, KEY_HEX),
+        curses.KEY_F10:         (KEY_TYPE_CTRL, KEY_HALT),
+        # ENTER (keypad, '\r' since `nonl()', and '\n' just in case)
+        curses.KEY_ENTER:       (KEY_TYPE_CTRL, KEY_ENTER),
+        curses.ascii.CR:        (KEY_TYPE_CTRL, KEY_ENTER),
+        curses.ascii.NL:        (KEY_TYPE_CTRL, KEY_ENTER),
+        # ESC (on its own, anyway)
+        curses.ascii.ESC:       (KEY_TYPE_CTRL, KEY_ESCAPE),
+        # backspace (depends on the terminal)
+        curses.KEY_BACKSPACE:   (KEY_TYPE_CTRL, KEY_ERASE),
+        curses.ascii.BS:        (KEY_TYPE_CTRL, KEY_ERASE),
+        curses.ascii.DEL:       (KEY_TYPE_CTRL, KEY_ERASE),
+        # nothing to do
+        curses.KEY_RESIZE:      (KEY_TYPE_CTRL, KEY_NONE),
+}
 # key action template (NOTE: has no purpose but to document structure)
 key_action = {
         'type':     0,  # a KEY_TYPE_
@@ -559,6 +873,118 @@ colors = {  # TODO: give actual values
 # }}}1
 
 # [FUNCTIONS] {{{1
+"""
+add_hook(fn)
+remove_hook(fn)
+    fn      := function taking one phase record (`dict')
+
+returns:    add_hook() => `fn' (so it works as a decorator)
+
+Every phase (see `phase()') that finishes while a hook is installed is
+    handed to each hook as a JSON-friendly record:
+
+        'phase'     := name of the phase ('read', 'parse', 'validate', ...)
+        'file'      := save file it was working on (None if unknown)
+        'depth'     := how many phases it's nested inside of
+        'wall'      := seconds it took
+        'cpu'       := seconds of CPU (this process) it took
+        'read'      := bytes read from (or mapped) save files
+        'written'   := bytes written to save files
+        'peak'      := peak traced memory while it ran, in bytes
+                       (None unless `tracemalloc' is tracing)
+        'error'     := name of the exception it ended with, if any
+
+Byte counts are process-wide, so phases running at the same time in
+    different threads count each other's I/O.
+"""
+def add_hook(fn): # {{{2
+    hooks.append(fn)
+    return fn
+# }}}2
+def remove_hook(fn): # {{{2
+    hooks.remove(fn)
+# }}}2
+
+"""
+phase(name, path=None)
+    name    := what's being done
+    path    := save file it's done to (defaults to the enclosing phase's)
+
+returns:    context manager timing whatever runs inside of it
+
+Costs (next to) nothing without hooks installed:
+
+        with phase('parse', fname):
+            parse(data)
+"""
+def phase(name, path=None): # {{{2
+    if not hooks:
+        return contextlib.nullcontext()
+    return timed_phase(name, path)
+# }}}2
+
+@contextlib.contextmanager
+def timed_phase(name, path): # {{{2
+    stack = running.__dict__.setdefault('phases', [])
+    parent = stack[-1] if stack else None
+    if path is None and parent is not None:
+        path = parent['file']
+    # peaks are process-wide: hand the parent its peak so far, then
+    # start over for this phase
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        if parent is not None:
+            parent['peak'] = max(parent['peak'],
+                                 tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    frame = {'file': path, 'peak': 0}
+    stack.append(frame)
+    read, written = io_stats['read'], io_stats['written']
+    wall, cpu = time.perf_counter(), time.process_time()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        stack.pop()
+        record = {
+                'phase':    name,
+                'file':     path,
+                'depth':    len(stack),
+                'wall':     wall,
+                'cpu':      cpu,
+                'read':     io_stats['read'] - read,
+                'written':  io_stats['written'] - written,
+                'peak':     None,
+        }
+        if tracing and tracemalloc.is_tracing():
+            record['peak'] = max(frame['peak'],
+                                 tracemalloc.get_traced_memory()[1])
+            if parent is not None:
+                parent['peak'] = max(parent['peak'], record['peak'])
+        if error is not None:
+            record['error'] = error
+        for fn in list(hooks):
+            fn(record)
+# }}}2
+
+"""
+profiled(paths)
+    paths   := save files
+
+returns:    (generator) each of `paths', with a 'file' phase running
+            while the caller works on it
+"""
+def profiled(paths): # {{{2
+    for path in paths:
+        with phase('file', path):
+            yield path
+# }}}2
+
 """
 checksum(stream)
     stream      := "bytes-like" data stream
@@ -568,10 +994,75 @@ returns:    computed checksum as integer
 Compute checksum for given chunk of memory in `stream'
 """
 def checksum(stream): # {{{2
-    n = 0
-    for b in stream:
-        n += b
-    return n
+    # `sum()' walks bytes-likes in C, no need to do it by hand
+    return sum(stream)
+# }}}2
+
+"""
+checksum_span()
+
+returns:    number of leading bytes of a save the checksums depend on
+"""
+def checksum_span(): # {{{2
+    return max(max(c['end'] for cs in save['checksum'] for c in cs['chunk']),
+               max(cs['addr'] + CHECKSUM_SIZE for cs in save['checksum']))
+# }}}2
+
+"""
+checksum_batch(streams)
+    streams     := 2-D `numpy.uint8' array (one save per row),
+                   or an iterable of "bytes-like" data streams
+
+returns:    (valid, expected, stored)
+                valid       := bool array, True where every checksum matches
+                expected    := uint16 array (N, len(save['checksum']))
+                stored      := uint16 array (N, len(save['checksum']))
+
+Computes every checksum in `save['checksum']' for a whole batch of saves
+    at once. All chunks of every checksum are summed for every save in a
+    single `numpy.add.reduceat()' pass over the stacked rows.
+
+Requires NumPy.
+"""
+def checksum_batch(streams): # {{{2
+    if np is None:
+        raise ImportError("checksum_batch() requires NumPy")
+    # every chunk, in address order, tagged with its checksum
+    chunks = sorted((c['start'], c['end'], i)
+                    for i, cs in enumerate(save['checksum'])
+                    for c in cs['chunk'])
+    # only the leading part of each save matters
+    width = checksum_span()
+    # stack the saves (if they aren't already)
+    if isinstance(streams, np.ndarray):
+        rows = streams
+    else:
+        rows = np.stack([np.frombuffer(s, dtype=np.uint8, count=width)
+                         for s in streams])
+    if rows.ndim != 2 or rows.shape[1] < width:
+        raise ValueError("saves must be at least {} bytes".format(width))
+    # segment boundaries: [start0, end0, start1, end1, ...]
+    bounds = [b for c in chunks for b in c[:2]]
+    if all(a < b for a, b in zip(bounds, bounds[1:])) and bounds[-1] < width:
+        # sum every segment of every row in one go, keep the chunks
+        sums = np.add.reduceat(rows[:, :width], bounds, axis=1,
+                               dtype=np.uint32)[:, 0::2]
+    else:
+        # chunks touch or overlap, sum them one at a time instead
+        sums = np.stack([rows[:, c[0]:c[1]].sum(axis=1, dtype=np.uint32)
+                         for c in chunks], axis=1)
+    # fold each chunk into its checksum
+    expected = np.zeros((rows.shape[0], len(save['checksum'])),
+                        dtype=np.uint32)
+    for j, c in enumerate(chunks):
+        expected[:, c[2]] += sums[:, j]
+    expected = (expected & 0xffff).astype(np.uint16)
+    # stored "little-endian" style
+    addrs = [cs['addr'] for cs in save['checksum']]
+    stored = (rows[:, addrs].astype(np.uint16) |
+              (rows[:, [a + 1 for a in addrs]].astype(np.uint16) << 8))
+    valid = (expected == stored).all(axis=1)
+    return valid, expected, stored
 # }}}2
 
 """
@@ -583,96 +1074,350 @@ returns:    ???
 Parses the given stream for data to fill associative map `save' with.
 """
 def parse(stream): # {{{2
-    # start iteration thru segments (keys)
-    for k in save.keys():
-        # we don't need to worry about the old checksums, so skip
-        if k is 'checksum':
-            continue
-        # get addresses for mem splicing
-        start   = save[k]['addr']
-        end     = start + save[k]['size']
-        # store its value in its place
-        save[k]['val'] = list(stream[start:end])
+    with phase('parse'):
+        # start iteration thru segments (keys)
+        for k in save.keys():
+            # we don't need to worry about the old checksums, so skip
+            if k == 'checksum':
+                continue
+            # get addresses for mem splicing
+            start   = save[k]['addr']
+            end     = start + save[k]['size']
+            # store its value in its place
+            save[k]['val'] = list(stream[start:end])
     return
 # }}}2
 
+"""
+SaveFile(fname, writable=False)
+    fname       := path to the save file
+    writable    := map the file read-write (edits land in the file)
+
+A save file memory-mapped into place. Instead of `parse()'-ing every
+    region into a `list', each field in `save' is handed out as a
+    zero-copy `memoryview' slice of the mapping:
+
+        with SaveFile("POKEGOLD.SAV") as sf:
+            name = str_decode(sf['player_name'])
+
+    Slices are writable iff the file was opened `writable'.
+    `buf' is a view of the entire file, for anything outside of `save'.
+
+Edits made through `write()' or `sf[key] = data' keep a running sum for
+    each checksum in `save['checksum']', adjusted by the old and new
+    values of the changed bytes only, and store the updated checksums
+    right away. Writing into `buf' (or a `pc_boxes()' array over it)
+    bypasses this; call `mark_dirty()' on what was changed afterwards,
+    then `store_checksums()' if the checksums should follow.
+Edited ranges are tracked in `dirty', and `flush()' only syncs those.
+    Once a writable slice has been handed out (`sf[key]'), any of it
+    may have changed behind our back, so `flush()' syncs the whole map.
+"""
+class SaveFile: # {{{2
+    def __init__(self, fname, writable=False):
+        self.fname      = fname
+        self.writable   = writable
+        # field name => memoryview slice (handed out lazily)
+        self.fields     = dict()
+        self.fd         = io.FileIO(fname, 'r+' if writable else 'r')
+        try:
+            # map the whole file, can't map an empty one though
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self.map = mmap.mmap(self.fd.fileno(), 0, access=access)
+        except (ValueError, OSError):
+            self.fd.close()
+            raise
+        self.buf = memoryview(self.map)
+        # every field (and checksum) has to be in there
+        if len(self.buf) < checksum_span():
+            self.buf.release()
+            self.map.close()
+            self.fd.close()
+            raise ValueError("file is too short")
+        io_stats['read'] += len(self.buf)
+        # running checksum sums (filled in by `rescan()' on first write)
+        self.sums       = None
+        # what `flush()' needs to push out
+        self.dirty      = DirtyRanges()
+        # writable slices are out there, so `dirty' can't be trusted
+        self.untracked  = False
+
+    def __getitem__(self, key):
+        view = self.fields.get(key)
+        if view is None:
+            f = schema[key]
+            view = self.buf[f.addr:f.end]
+            self.fields[key] = view
+        if self.writable:
+            self.untracked = True
+        return view
+
+    def __setitem__(self, key, data):
+        f = schema[key]
+        # checksums are kept up to date by `write()' itself
+        if f.type == TYPE_CHECKSUM:
+            raise KeyError(key)
+        # fields are fixed-size, don't spill into the next one
+        if len(data) > f.size:
+            raise ValueError("{} is only {} bytes".format(key, f.size))
+        self.write(f.addr, data)
+
+    def __len__(self):
+        return len(self.buf)
+
+    def party(self):
+        # the party, as `Pokemon' bound to this file
+        return pokeparty_decode(self, save['pokemon_party']['addr'])
+
+    def rescan(self):
+        # sum every chunk of every checksum from scratch
+        self.sums = list()
+        for cs in save['checksum']:
+            n = 0
+            for chunk in cs['chunk']:
+                n += checksum(self.buf[chunk['start']:chunk['end']])
+            self.sums.append(n)
+        return self.sums
+
+    def write(self, addr, data):
+        if not self.writable:
+            raise TypeError("{} is opened read-only".format(self.fname))
+        end = addr + len(data)
+        if addr < 0 or end > len(self.buf):
+            raise IndexError("write past end of save")
+        if self.sums is None:
+            self.rescan()
+        data = memoryview(data).cast('B')
+        # only the overlap of the write with each chunk changes its sum
+        for i, cs in enumerate(save['checksum']):
+            for chunk in cs['chunk']:
+                lo = max(addr, chunk['start'])
+                hi = min(end, chunk['end'])
+                if lo < hi:
+                    self.sums[i] += (checksum(data[lo - addr:hi - addr]) -
+                                     checksum(self.buf[lo:hi]))
+        self.buf[addr:end] = data
+        self.dirty.add(addr, end)
+        self.store_checksums()
+        return
+
+    def store_checksums(self):
+        if self.sums is None:
+            self.rescan()
+        for cs, n in zip(save['checksum'], self.sums):
+            # stored "little-endian" style, cut off at 2 bytes
+            dest = cs['addr']
+            if self.buf[dest] | (self.buf[dest + 1] << 8) == n & 0xffff:
+                continue
+            self.buf[dest]      = n & 0x00ff
+            self.buf[dest + 1]  = (n & 0xff00) >> 8
+            self.dirty.add(dest, dest + CHECKSUM_SIZE)
+        return
+
+    def mark_dirty(self, start, end):
+        # changed behind `write()''s back: sync it, and re-sum later
+        self.dirty.add(start, end)
+        self.sums = None
+        return
+
+    def keys(self):
+        return (f.name for f in schema if f.type != TYPE_CHECKSUM)
+
+    def flush(self):
+        if self.writable and self.untracked:
+            # no telling what changed, let the kernel sort it out
+            io_stats['written'] += len(self.buf)
+            self.map.flush()
+            self.dirty.clear()
+        # push only the pages holding edits to the file
+        elif self.writable:
+            for start, end in self.dirty:
+                # `mmap.flush()' wants page-aligned offsets
+                io_stats['written'] += end - start
+                start -= start % mmap.PAGESIZE
+                self.map.flush(start, end - start)
+            self.dirty.clear()
+        return
+
+    def close(self):
+        # nothing to do if we're already closed
+        if self.map is None:
+            return
+        self.flush()
+        # every exported view must be released before the map can close
+        for view in self.fields.values():
+            view.release()
+        self.fields.clear()
+        self.buf.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # somebody still holds a slice, the map goes away with it
+            pass
+        self.fd.close()
+        self.map = None
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+# }}}2
+
 """
 get_input()
 
 returns:    `key_action' struct (see DATA-UI)
+            None if no key is waiting
 
 Translates input from CURSES into apropos action{} for internal parsing.
 """
 def get_input(): # {{{2
-    # pop 3 characters from stack, as the
-    # arrows and Fn keys are escape sequences
-    # NOTE: this may just be a linux thing...
-    ch = (window.getch(), window.getch(), window.getch())
-
-    # translate curses key into internal action
-    action = None
-
-# CONTROL KEYS
+    # grab the next key, `keypad()' hands over whole
+    # arrow / Fn keys instead of their escape sequences
+    ch = window.getch()
     # since we are in no-delay mode, -1 means no input is ready
-    if ch[0] == curses.ERR:     # curses.ERR == -1
-        action = {'type': KEY_TYPE_CTRL, 'key': KEY_NONE}
-    # ENTER key
-    elif ch[0] == curses.ascii.CR:  # '\r'
-        action = {'type': KEY_TYPE_CTRL, 'key': KEY_ENTER}
-    # ESC or escape sequence?
-    elif ch[0] == curses.ascii.ESC:
-        # ESC key
-        if ch[1] == curses.ERR:
-            action = {'type': KEY_TYPE_CTRL, 'key': KEY_ESCAPE}
-        # escape sequences
-        else:
-            # time to quit?
-            if ch[1:] == ESC_SEQ['F10']:
-                action = {'type': KEY_TYPE_CTRL, 'key': KEY_HALT}
-# MOVEMENT KEYS
-            # UP arrow
-            elif ch[1:] == ESC_SEQ['UP']:
-                action = {'type': KEY_TYPE_MOVE, 'key': KEY_UP}
-            # LEFT arrow
-            elif ch[1:] == ESC_SEQ['LEFT']:
-                action = {'type': KEY_TYPE_MOVE, 'key': KEY_LEFT}
-            # DOWN arrow
-            elif ch[1:] == ESC_SEQ['DOWN']:
-                action = {'type': KEY_TYPE_MOVE, 'key': KEY_DOWN}
-            # RIGHT arrow
-            elif ch[1:] == ESC_SEQ['RIGHT']:
-                action = {'type': KEY_TYPE_MOVE, 'key': KEY_RIGHT}
-# TEXT KEYS
+    if ch == curses.ERR:
+        return None
+    # translate curses key into internal action
+    if ch in KEY_MAP:
+        kind, key = KEY_MAP[ch]
+        return {'type': kind, 'key': key}
     # chances are whatever is left over is text
-    else:
-        action = {'type': KEY_TYPE_TEXT, 'key': ch[0]}
+    return {'type': KEY_TYPE_TEXT, 'key': ch}
+# }}}2
+
+"""
+read_keys(keys)
+    keys    := `asyncio.Queue' to put `key_action's into
+
+Called by the event loop whenever the terminal has input; hands every
+    key curses has buffered over to `ui_loop()'.
+"""
+def read_keys(keys): # {{{2
+    while True:
+        action = get_input()
+        # all caught up
+        if action is None:
+            break
+        keys.put_nowait(action)
+    return
+# }}}2
+
+"""
+set_status(text)
+    text    := message for the status bar
+
+Shows `text' along the bottom line, without touching the rest.
+"""
+def set_status(text): # {{{2
+    # no UI, no status
+    if statusbar is None:
+        return
+    a = curses.color_pair(colors['label']['n']) | curses.A_REVERSE
+    try:
+        statusbar.erase()
+        statusbar.addnstr(0, 0, text.ljust(view['width'] - 1),
+                          view['width'] - 1, a)
+    except curses.error as e:
+        sys.stderr.write("[STATUS]: " + str(e) + '\n')
+    statusbar.noutrefresh()
+    curses.doupdate()
+    return
+# }}}2
+
+"""
+move_index(key)
+    key     := KEY_* movement code
+
+Moves the selection (view['index']) around the list of rows, making
+    sure it doesn't go too far up or down.
+"""
+def move_index(key): # {{{2
+    last = max(len(rows) - 1, 0)
+    step = {
+            KEY_UP:     -1,
+            KEY_DOWN:   1,
+            KEY_PGUP:   -view['height'],
+            KEY_PGDN:   view['height'],
+            KEY_HOME:   -len(rows),
+            KEY_END:    len(rows),
+    }.get(key, 0)
+    view['index'] = min(max(view['index'] + step, 0), last)
+    return
+# }}}2
+
+"""
+jump_address(text)
+    text    := what was typed at the goto prompt
+
+returns:    address `text' is talking about, either a field name or
+            hex (with or without '0x'); None if it's neither
+"""
+def jump_address(text): # {{{2
+    text = text.strip()
+    if text in schema:
+        return schema[text].addr
+    try:
+        return int(text, 16)
+    except ValueError:
+        return None
+# }}}2
+
+"""
+prompt_key(action, txn)
+    action  := `key_action' typed while the goto prompt is up
+    txn     := `Transaction' being edited
 
-    # return translated key
-    return action
+Handles the goto prompt of the hex view: hex digits (or a field name)
+    and ENTER jump to that line, ESC gives up.
+"""
+def prompt_key(action, txn): # {{{2
+    if action['type'] == KEY_TYPE_CTRL:
+        # never mind
+        if action['key'] == KEY_ESCAPE:
+            view['prompt'] = None
+            set_status("")
+            return
+        # off we go
+        elif action['key'] == KEY_ENTER:
+            text, view['prompt'] = view['prompt'], None
+            addr = jump_address(text)
+            if addr is None or not 0 <= addr < len(txn.data):
+                set_status("can't go to {!r}".format(text))
+            else:
+                view['index'] = addr // HEX_WIDTH
+                set_status("{:#06x}".format(addr))
+            return
+        elif action['key'] == KEY_ERASE:
+            view['prompt'] = view['prompt'][:-1]
+    # only printable text goes in
+    elif action['type'] == KEY_TYPE_TEXT and 0x20 <= action['key'] < 0x7f:
+        view['prompt'] += chr(action['key'])
+    set_status("goto: " + view['prompt'])
+    return
 # }}}2
 
 """
-ui_loop()
+ui_loop(keys, verify, load)
+    keys    := `asyncio.Queue' of `key_action's (see `read_keys()')
+    verify  := `asyncio.Event' to set once the data has been edited
+    load    := future for the `Transaction' being loaded
 
 Updates view intelligently based on current mode.
 
-This function will get user input and handle
+This function will wait on user input and handle
 `key_action' returned per MODE_* (see DATA-UI).
 
 Handles drawing/refresh of CURSES window as well.
 """
-def ui_loop(): # {{{2
-    # global window instance
-    global window
+async def ui_loop(keys, verify, load): # {{{2
     # run until the wheels fall off
     while True:
-        # begin by writing info to the window
-        #prep_display()
-        # get input as an action
-        action = get_input()
-
-        # store the old field index
-        index = view['index']
+        # wait for input as an action (the loop stays free meanwhile)
+        action = await keys.get()
 
         # check some important control keys first
         if action['type'] == KEY_TYPE_CTRL:
@@ -682,28 +1427,47 @@ def ui_loop(): # {{{2
             # wheels fell off!
             elif action['key'] == KEY_HALT:
                 break
+# GOTO PROMPT
+        if view['prompt'] is not None:
+            prompt_key(action, load.result())
 # DISPLAY MODE
-        if view['mode'] == MODE_DISPLAY:
+        elif view['mode'] == MODE_DISPLAY:
             # CONTROL
             if action['type'] == KEY_TYPE_CTRL:
                 # go to edit screen
                 if action['key'] == KEY_ENTER:
                     view['mode'] = MODE_EDIT
+                # go to the hex view (once there's something to see)
+                elif action['key'] == KEY_HEX and load.done():
+                    prep_hex(load.result())
+                    set_status("hex view (g: goto, F2: fields)")
             # MOVEMENT
             elif action['type'] == KEY_TYPE_MOVE:
-                # we only care about up and down arrows
-                if action['key'] == KEY_UP:
-                    # make sure we don't go too far up
-                    if view['index'] > 0:
-                        view['index'] -= 1
-                    else:
-                        view['index'] = 0
-                elif action['key'] == KEY_DOWN:
-                    # make sure we don't go too far down
-                    if view['index'] < (len(save.keys()) - 1):
-                        view['index'] += 1
-                    else:
-                        view['index'] = (len(save.keys()) - 2)
+                move_index(action['key'])
+# HEX MODE
+        elif view['mode'] == MODE_HEX:
+            # CONTROL
+            if action['type'] == KEY_TYPE_CTRL:
+                # back to the fields, landing on one in this line
+                if action['key'] == KEY_HEX:
+                    addr = view['index'] * HEX_WIDTH
+                    prep_display(load.result())
+                    names = [label for label, value in rows]
+                    view['index'] = 0
+                    for f in schema.within(addr, addr + HEX_WIDTH):
+                        if f.name in names:
+                            view['index'] = names.index(f.name)
+                            break
+                    set_status("")
+            # MOVEMENT
+            elif action['type'] == KEY_TYPE_MOVE:
+                move_index(action['key'])
+            # TEXT
+            elif action['type'] == KEY_TYPE_TEXT:
+                # 'g'oto an address (or field)
+                if action['key'] == ord('g'):
+                    view['prompt'] = ''
+                    set_status("goto: ")
 # EDIT MODE
         elif view['mode'] == MODE_EDIT:
             # CONTROL
@@ -716,6 +1480,8 @@ def ui_loop(): # {{{2
                 elif action['key'] == KEY_ENTER:
                     view['mode'] = MODE_DISPLAY
                     # TODO: SAVE CHANGES
+                    # have the checksums looked over again
+                    verify.set()
             # MOVEMENT
             elif action['type'] == KEY_TYPE_MOVE:
                 # UP/DOWN change position of multi-line cursor
@@ -749,203 +1515,346 @@ def ui_loop(): # {{{2
                 # TODO: determine INSERT vs OVERWRITE
                 # TODO: change value(s) to text inserted
                 pass
-        # TODO: update viewports from index or coordinate changes
-        # TODO: update display with new values or new viewport position
-
-# FIXME: this does not work, need more complex checks to determine
-#           whether or not the screen space will be scrolled
-        # amount to scroll screen
-        lines = 0
-        # did it scroll up?
-        if index < view['index']:
-            lines = 1
-        # did it scroll down?
-        elif index > view['index']:
-            lines = -1
-
-# FIXME: unable to use if setscrreg() isn't working!
-        # scroll the screen (if needed)
-        #window.scroll(lines)
-
-        # prep entire window for redraw
-        window.touchwin()
-        # redraw that window, holmes
-        window.refresh()
+        # scroll (if needed) and redraw only what changed
+        draw_rows()
     return
 # }}}2
 
 """
-prep_display()
+RenderCache(size)
+    size    := most values to keep
+
+Rendered (display) values, by field name and version: a value is only
+    rendered again once its field's version changes (i.e. its bytes were
+    written to), and only the `size' most recently used ones are kept.
 
-Prepare the window with the data to be displayed.
+        rendered.get('money', txn.versions['money'], render, f, mem)
 """
-def prep_display(): # {{{2
-# TODO: BASE WHAT TO START WRITING AND WHEN TO STOP ON VIEWPORT TOP/BOTTOM
+class RenderCache: # {{{2
+    def __init__(self, size):
+        self.size   = size
+        self.values = collections.OrderedDict()
+        self.hits   = 0
+        self.misses = 0
+
+    def get(self, key, version, render, *args):
+        hit = self.values.get(key)
+        if hit is not None and hit[0] == version:
+            self.hits += 1
+            self.values.move_to_end(key)
+            return hit[1]
+        # new, or its bytes changed since
+        self.misses += 1
+        value = render(*args)
+        self.values[key] = (version, value)
+        self.values.move_to_end(key)
+        if len(self.values) > self.size:
+            # toss the least recently used
+            self.values.popitem(last=False)
+        return value
+
+    def clear(self):
+        self.values.clear()
+# }}}2
 
-    # save my wrists pls
-    global window
-    w = window
-    LINES = view['height']
-    COLS = view['width']
+# rendered values for the editor, and lines for its hex view
+rendered = RenderCache(RENDER_CACHE_SIZE)
+hexlines = RenderCache(HEX_CACHE_SIZE)
 
-    # determine the tabstop string in save.keys() before-hand
-    tabstop = 0
-    #       TODO: optimize this to be in iteration loop
-    # this can be done by writing labels, going to 0, then writing values!
-    for k in save.keys():
-        if tabstop < len(k):
-            tabstop = len(k)
-
-    # make sure the cursor is in the upper-left position
-    w.move(0, 0)
-    # zero out positional vars
-    y, x = w.getyx()
-
-    # iterate through the save's data
-    for k in save.keys():
-        # last entry is checksum, so...
-        if k is 'checksum':
-            # ...AUTOBOTS - ROLL OUT!
-            break
+"""
+prep_display(txn)
+    txn     := `Transaction' holding the save being edited
 
-        # print the label field
-        try:
-            # set label attributes
-            a = curses.color_pair(colors['label']['n']) | curses.A_NORMAL
-            w.attron(a)
-# FIXME:    if(x - len(str) >= COLS) --> BAIL
-            # label is simply the key
-            w.addstr(k)
-            w.attroff(a)
-        # yoinks! error occurred!
-        except curses.error as e:
-            # TODO: output to debug log or something
-            sys.stderr.write("[LABEL]: " + str(e) + '\n')
-            return None
+Prepare the (virtual) list of rows to be displayed.
 
-        # determine how much to move the cursor
-        y, x = w.getyx()
-
-        ## let's use tabstop of 8
-        #ts = (x % 8)
-        #if ts == 0:
-            #ts = 8
-
-        # indent to where we want the edit field
-        w.move(y, x + (tabstop - len(k)) + 1)
-
-        # determine what `value' is
-        value = None
-        # size of the field determines a lot...
-        size = save[k]['size']
-        # is it the options bytes?
-        if size == OPTIONS_SIZE:
-            # TODO: make these ellipses, or just display the options?
-            value = "<OPTIONS>"
-        # TODO: is it an ID?
-        elif size == ID_SIZE:
-            pass
-        # is it an encoded string?
-        elif size == NAME_SIZE:
-            value = str_decode(save[k]['val'])
-        # TODO: is it the player's money?
-        elif size == MONEY_SIZE:
-            pass
-        # TODO: is it the bag's TM pocket?
-        elif size == TM_POCKET_SIZE:
-            pass
-        # TODO: is it the bag's ITEM pocket?
-        elif size == ITEM_POCKET_SIZE:
-            pass
-        # TODO: is it the bag's KEY ITEM pocket?
-        elif size == KEY_POCKET_SIZE:
-            pass
-        # TODO: is it the bag's BALL pocket?
-        elif size == BALL_POCKET_SIZE:
-            pass
-        # TODO: is it the POKEDEX fields?
-        elif size == POKEDEX_SIZE:
-            pass
-        # is it a Pokemon?
-        elif size == POKEMON_SIZE:
-            value = "<POKeMON>"
-        # TODO: is it the player's party?
-        elif size == POKEPARTY_SIZE:
-            pass
-        # TODO: is it the items in PC storage?
-        elif size == PC_ITEM_SIZE:
-            pass
-        # TODO: is it PC box names?
-        elif size == PC_NAME_SIZE:
-            pass
-        # is it a Bill's PC Box?
-        elif size == POKEBOX_SIZE:
-            value = "<POKeBOX>"
-        elif size == 0:
-            pass
-        # raw bytes = raw attitude
-        else:
-            value = str(save[k]['val'])
-            # ellipses are fancy and mean more data
-            #value = "<...>"
+Every field becomes a row of `rows', but nothing is decoded or drawn
+    here: `draw_rows()' only renders the rows between view['top'] and
+    view['bottom'], into a pad as tall as the whole list. Rendered values
+    come out of `rendered', so only fields that changed get decoded again.
+"""
+def prep_display(txn): # {{{2
+    global rows
+    view['mode'] = MODE_DISPLAY
+    # one row per field, values are looked up as they're drawn
+    rows = [(f.name, (lambda f=f: rendered.get(
+                f.name, txn.versions[f.name],
+                display_value, f, f.view(txn.data))))
+            for f in schema if f.type != TYPE_CHECKSUM]
+    # line the values up after the longest label
+    view['tabstop'] = max(len(label) for label, value in rows)
+    prep_pad()
+    # place the cursor back at the start
+    window.move(0, 0)
+    # zero-out the cursor's position
+    view['y'], view['x'] = 0, 0
+    # all done!
+    return
+# }}}2
+
+"""
+prep_hex(txn)
+    txn     := `Transaction' holding the save being edited
+
+Prepare the hex view: one row per HEX_WIDTH bytes of the whole save,
+    known or not, with the fields of the layout overlaid by name. The
+    selected field's line is the one selected.
+"""
+def prep_hex(txn): # {{{2
+    global rows
+    # keep whatever field was selected in view
+    addr = 0
+    if view['mode'] == MODE_DISPLAY and rows:
+        addr = schema[rows[view['index']][0]].addr
+    view['mode'] = MODE_HEX
+    rows = [("{:04x}".format(a), (lambda a=a: hex_line(txn, a)))
+            for a in range(0, len(txn.data), HEX_WIDTH)]
+    view['tabstop'] = 4
+    view['index'] = addr // HEX_WIDTH
+    prep_pad()
+    return
+# }}}2
+
+"""
+hex_line(txn, addr)
+    txn     := `Transaction' holding the save being edited
+    addr    := address of the line
+
+returns:    the line as text: hex, glyphs, and the fields it overlaps
+
+Lines come out of `hexlines' as long as their bytes are the same, so
+    paging around only formats the lines it hasn't seen (or that changed).
+"""
+def hex_line(txn, addr): # {{{2
+    mem = bytes(txn.data[addr:addr + HEX_WIDTH])
+    return hexlines.get(addr, mem, hex_format, addr, mem)
+# }}}2
+
+"""
+hex_format(addr, mem)
+    addr    := address of the line
+    mem     := the line's bytes
+
+returns:    the line as text (see `hex_line()')
+"""
+def hex_format(addr, mem): # {{{2
+    text = mem.hex(' ').ljust(HEX_WIDTH * 3 - 1)
+    glyphs = ''.join(hex_glyphs[b] for b in mem).ljust(HEX_WIDTH)
+    names = ', '.join(f.name for f in schema.within(addr, addr + len(mem)))
+    return "{}  |{}|  {}".format(text, glyphs, names).rstrip()
+# }}}2
+
+"""
+prep_pad()
+
+(Re-)creates the pad behind `rows', the selection stays where it is.
+"""
+def prep_pad(): # {{{2
+    global pad
+    # the pad backs the whole list, only visible lines get drawn on it
+    pad = curses.newpad(max(len(rows), 1), view['width'])
+    drawn.clear()
+    view['top'] = 0
+    # a shorter list doesn't cover all of the last one, wipe the screen
+    # (all but the status line) for the pad to be copied onto
+    if window is not None:
+        for y in range(0, view['height']):
+            window.move(y, 0)
+            window.clrtoeol()
+        window.noutrefresh()
+    return
+# }}}2
 
-        # amount of lines the data wraps
-        wrap = 0
+"""
+draw_rows()
 
-        # now that we have the value to print, MAKE IT SO!
+Scrolls the viewport so the selected row (view['index']) is visible,
+    moving it as little as possible, then (re-)draws only the visible
+    rows whose text or selection changed since they were last drawn.
+"""
+def draw_rows(): # {{{2
+    # nothing loaded (yet)
+    if pad is None:
+        return
+    LINES = view['height']
+    COLS = view['width']
+    # keep the selection on screen
+    if view['index'] < view['top']:
+        view['top'] = view['index']
+    elif view['index'] >= view['top'] + LINES:
+        view['top'] = view['index'] - LINES + 1
+    view['bottom'] = min(view['top'] + LINES, len(rows)) - 1
+
+    for i in range(view['top'], view['bottom'] + 1):
+        label, value = rows[i]
+        value = value()
+        selected = (i == view['index'])
+        # same as what's up there already? leave it be
+        if drawn.get(i) == (value, selected):
+            continue
+        drawn[i] = (value, selected)
+        # room left for the value after the label (and last column)
+        room = COLS - view['tabstop'] - 2
+        if len(value) > room:
+            # ellipses are fancy and mean more data
+            value = value[:max(room - 5, 0)] + "<...>"
         try:
-# FIXME:    if(length test) --> blah blah
-            # enable attributes for edit field
+            pad.move(i, 0)
+            pad.clrtoeol()
+            # print the label field
+            a = curses.color_pair(colors['label']['n']) | curses.A_NORMAL
+            pad.addnstr(i, 0, label, COLS - 1, a)
+            # now the value, highlighted if it's selected
             a = curses.color_pair(colors['edit']['n']) | curses.A_BOLD
-            w.attron(a)
-            # get current coordinates for wrap math
-            y, x = w.getyx()
-            # how many times does the data wrap?
-            wrap = int((len(value) + x) / COLS)
-            if (y + wrap) >= LINES:
-                value = "<...>"
-            # write the value out, and disable attributes
-            w.addstr(value)
-            w.attroff(a)
+            if selected:
+                a |= curses.A_REVERSE
+            pad.addnstr(i, view['tabstop'] + 1, value, max(room, 0), a)
         # an error occurred! D:
         except curses.error as e:
             # TODO: output to debug log or something
-            sys.stderr.write("[EDIT]: " + str(e) + '\n')
-            return None
-        # figure out how much exactly to move
-        y, x = w.getyx()
-        #if value is "<...>":
-            #y += 1
-        #else:
-            ## determine if move is valid
-            #y = y + wrap + 1
-        if (y + 1) >= LINES:
-            # uh-oh, moving past end of window...
-            y = LINES - 1
-        # cooool, now we advance a line (or n lines)
-        w.move(y + 1, 0)
-        # get updated positions
-        y, x = w.getyx()
-
-    # mark window for redraw
-    w.noutrefresh()
-    # place the cursor back at the start
-    w.move(0, 0)
-    # zero-out the cursor's position
-    view['y'], view['x'] = w.getyx()
-    # mark window for redraw
+            sys.stderr.write("[ROW]: " + str(e) + '\n')
+    # copy the visible part of the pad to the screen, curses only sends
+    # the cells that actually changed
+    pad.noutrefresh(view['top'], 0, 0, 0,
+                    max(min(LINES, len(rows)) - 1, 0), COLS - 1)
     curses.doupdate()
-    # all done!
     return
 # }}}2
 
 """
-display(stream)
-    stream      := "bytes-like" data stream
+display_value(f, val)
+    f       := `Field' from `schema'
+    val     := field contents
 
-returns:    ???
+returns:    the string to show in the field's edit column
+"""
+def display_value(f, val): # {{{2
+    # is it the options bytes?
+    if f.type == TYPE_OPTIONS:
+        # TODO: make these ellipses, or just display the options?
+        return "<OPTIONS>"
+    # is it the player's party?
+    elif f.type == TYPE_POKELIST:
+        return "<POKeMON>"
+    # is it a Bill's PC Box?
+    elif f.type == TYPE_POKEBOX:
+        return "<POKeBOX>"
+    # names, IDs, money, time and the like decode nicely
+    elif f.type in (TYPE_NAME, TYPE_ID, TYPE_MONEY, TYPE_TIME,
+                    TYPE_BOXNAMES):
+        # views and lists alike
+        return field_str(f.name, bytes(val))
+    # how many out of how many
+    elif f.type == TYPE_POKEDEX:
+        return "{} / {}".format(len(Pokedex.from_bytes(val)), POKEDEX_COUNT)
+    # TODO: bag pockets, PC items
+    # raw bytes = raw attitude
+    return str(list(val))
+# }}}2
+
+"""
+load_save(fname)
+    fname   := path to the save file
+
+returns:    `Transaction' for the save (fields are read straight out of
+            its `data', nothing gets `parse()'d up front)
+
+Runs in a worker thread (see `ui_main()'), so problems are raised for
+    the caller to report instead of shutting down from in here.
+"""
+def load_save(fname): # {{{2
+    with phase('load', fname):
+        txn = Transaction(fname)
+        if len(txn.data) == 0:
+            # zoinks! file couldn't be read!
+            raise ValueError("file is empty or couldn't be read")
+    return txn
+# }}}2
+
+"""
+verify_loop(txn, verify)
+    txn     := `Transaction' being edited
+    verify  := `asyncio.Event', set whenever the data changes
+
+Re-checks the checksums each time `verify' is set, off in a worker
+    thread, and reports the result on the status bar.
+"""
+async def verify_loop(txn, verify): # {{{2
+    loop = asyncio.get_running_loop()
+    while True:
+        await verify.wait()
+        verify.clear()
+        # sum a copy, so edits made meanwhile can't tear the result
+        status = await loop.run_in_executor(None, checksum_status,
+                                            bytes(txn.data))
+        bad = ["{:#06x}".format(addr)
+               for addr, stored, x in status if stored != x]
+        if bad:
+            set_status("checksum mismatch at {} (fixed on save)".format(
+                       ", ".join(bad)))
+        else:
+            set_status("checksums OK")
+# }}}2
+
+"""
+ui_main(fname)
+    fname   := path to the save file
+
+returns:    `Transaction' for the save
+            None if the user quit before it finished loading
 
-Displays the save-data parsed earlier for the user to peruse.
+The editor's event loop: the save loads and decodes in the background
+    while the (empty) screen is already taking input, keys are read as
+    the terminal has them, and `verify_loop()' keeps the status bar
+    up-to-date after every edit.
+"""
+async def ui_main(fname): # {{{2
+    loop = asyncio.get_running_loop()
+    keys = asyncio.Queue()
+    verify = asyncio.Event()
+    # read keys whenever the terminal has some
+    loop.add_reader(sys.stdin.fileno(), read_keys, keys)
+    set_status("loading {} ...".format(fname))
+    # load & decode off in a worker, the UI keeps going meanwhile
+    load = loop.run_in_executor(None, load_save, fname)
+    ui = asyncio.ensure_future(ui_loop(keys, verify, load))
+    checker = None
+    try:
+        done, pending = await asyncio.wait(
+                {load, ui}, return_when=asyncio.FIRST_COMPLETED)
+        # quit before it even finished loading? (or the UI blew up)
+        if ui in done:
+            ui.result()
+            return None
+        # any file errors come out here
+        txn = load.result()
+        # versions (and lines) start over with every save
+        rendered.clear()
+        hexlines.clear()
+        # begin by writing info to the window
+        prep_display(txn)
+        draw_rows()
+        set_status("loaded {} (F2: hex view, F10: quit)".format(fname))
+        # keep an eye on the checksums, starting now
+        checker = asyncio.ensure_future(verify_loop(txn, verify))
+        verify.set()
+        # enter UI loop, and it will guide us...ohm...
+        await ui
+        return txn
+    finally:
+        loop.remove_reader(sys.stdin.fileno())
+        for task in (load, ui, checker):
+            if task is not None:
+                task.cancel()
+# }}}2
+
+"""
+display(fname)
+    fname       := path to the save file
+
+returns:    `Transaction' for the save (see `ui_main()')
+            None if the user quit before it finished loading
+
+Loads and displays the save-data for the user to peruse.
 Encapsulated inside is the UI subsystem startup and UI main loop.
 
 TODO:
@@ -954,21 +1863,17 @@ TODO:
     - party pokemon
     - PC pokemon
 """
-def display(stream): # {{{2
+def display(fname): # {{{2
     # make sure the curses subsystem has been started
     curses_init()
 
     # (re-)initialize viewport information
     view['mode']    = MODE_DISPLAY
     view['index']   = 0
-    #view['height']  = LINES
-    #view['width']   = COLS
-    # begin by writing info to the window
-    prep_display()
-    # enter UI loop, and it will guide us...ohm...
-    ui_loop()
-
-    return None
+    view['prompt']  = None
+    # the first screen shows up right away, the save comes in later
+    with phase('display', fname):
+        return asyncio.run(ui_main(fname))
 # }}}2
 
 """
@@ -997,151 +1902,527 @@ def edit(stream): # {{{2
 # }}}2
 
 """
-validate(stream)
+validate(stream, verify=False, dirty=None)
     stream      := "bytes-like" data stream
+    verify      := only report, don't fix anything
+    dirty       := `DirtyRanges' to note any checksum words changed in
 
-returns:    a new data stream with changes
+returns:    `stream' itself, with the checksums patched in-place
+                (a patched copy if `stream' is read-only, e.g. `bytes')
+            if `verify': see `checksum_status()'
 
 Computes primary and secondary checksums from data provided in `stream'.
+The two little-endian checksum words are written straight into `stream'
+    (`bytearray', writable `mmap' or `memoryview'), no list copies.
+"""
+def validate(stream, verify=False, dirty=None): # {{{2
+    with phase('checksum' if verify else 'validate'):
+        # just looking, thanks
+        if verify:
+            return checksum_status(stream)
+        # can we patch in-place? if not, make the one copy we need
+        view = memoryview(stream)
+        if view.readonly:
+            view.release()
+            stream = bytearray(stream)
+            view = memoryview(stream)
+        # dynamically determine and compute checksums
+        for dest, stored, x in checksum_status(view):
+            # already right? then there's nothing to write back
+            if stored == x:
+                continue
+            # now store the resulting calculation "little-endian" style
+            view[dest]      = x & 0x00ff
+            view[dest + 1]  = (x & 0xff00) >> 8
+            if dirty is not None:
+                dirty.add(dest, dest + CHECKSUM_SIZE)
+        view.release()
+        return stream
+# }}}2
+
+"""
+checksum_status(stream)
+    stream      := "bytes-like" data stream
+
+returns:    list of (addr, stored, computed) tuples, one per checksum
+
+Reports the checksums currently stored in `stream' alongside the ones
+    computed from its contents. Nothing is copied or changed; each chunk
+    is summed through a `memoryview' slice.
 """
-def validate(stream): # {{{2
-    # store fixes in list...
-    new = list(stream)
-    # dynamically determine and compute checksums
+def checksum_status(stream): # {{{2
+    view = memoryview(stream)
+    status = list()
     for cs in save['checksum']:
         # where result is stored
         dest = cs['addr']
-        # list of results
-        r = list()
-        # iterate thru chunks
+        # stored "little-endian" style
+        stored = view[dest] | (view[dest + 1] << 8)
+        # sum of every chunk, cut off at 2 bytes
+        computed = 0
         for chunk in cs['chunk']:
-            # each memory chunk has a start and an end
-            r.append(checksum(stream[chunk['start']:chunk['end']]))
-        # now add up all the checksums computed for this `chunk'
-        x = 0
-        for i in r:
-            x += i
-        # cut off anything longer than 2 bytes
-        x = x & 0xffff
-        # splice for insertion
-        temp = new[:dest]
-        # now store the resulting calculation "little-endian" style
-        temp.append(x & 0x00ff)
-        temp.append((x & 0xff00) >> 8)
-        # slap in the rest of the stream...
-        temp += new[dest+2:]
-        # store changes
-        new = temp
-        del temp
-    return bytes(new)
+            computed += checksum(view[chunk['start']:chunk['end']])
+        computed &= 0xffff
+        status.append((dest, stored, computed))
+    view.release()
+    return status
 # }}}2
 
 """
-sync(stream, fd)
+sync(stream, fd, dirty=None)
     stream      := "bytes-like" data stream
-    fd          := file descriptor opened via `io.FileIO'
+    fd          := file descriptor opened via `io.FileIO' (for writing)
+    dirty       := `DirtyRanges' of the bytes that changed
+                   (None writes all of `stream')
 
 returns:    True if no problems arised, all hunky-dory
             False if file errors or other silly nonsense occurred
 
 Synchronizes any changes made by the user back to the save file.
-
-TODO:
-    - write changes back to file
+Only the dirty ranges are written, each with a single positional write
+    (neighbouring ranges are coalesced first), so a fixed checksum costs
+    two bytes of I/O instead of the whole save.
 """
-def sync(stream, fd): # {{{2
-    # TODO: write changes in `stream' back to `fd'
-    #fd.write(stream)
-
-    # flush changes
-    fd.flush()
-    # close file handle
-    fd.close()
-    # XXX: return whether there were any file errors?
+def sync(stream, fd, dirty=None): # {{{2
+    try:
+        with phase('sync', fd.name if isinstance(fd.name, str) else None):
+            if dirty is None:
+                # no idea what changed, write it all
+                io_stats['written'] += os.pwrite(fd.fileno(), stream, 0)
+            else:
+                view = memoryview(stream)
+                for start, end in dirty:
+                    io_stats['written'] += os.pwrite(fd.fileno(),
+                                                     view[start:end], start)
+                view.release()
+                dirty.clear()
+            # flush changes
+            fd.flush()
+    except (OSError, IOError) as e:
+        sys.stderr.write("[SYNC]: " + str(e) + '\n')
+        return False
+    finally:
+        # close file handle
+        fd.close()
     return True
 # }}}2
 
 """
-str_encode(mem)
-str_decode(mem)
-    mem     := "bytes-like" data stream
-
-returns:    str_encode() => encoded string
-            str_decode() => decoded string
+DirtyRanges()
 
-These two functions convert a PKMN proprietary string
-    back and forth into its ASCII equivalent.
+The byte ranges of a save that have been changed, kept as a sorted list
+    of non-overlapping [start, end) pairs. Ranges that overlap or touch
+    are merged as they're added, so iterating gives the fewest writes.
+"""
+class DirtyRanges: # {{{2
+    def __init__(self):
+        self.ranges = list()
+
+    def add(self, start, end):
+        if start >= end:
+            return
+        # first range that could touch [start, end)
+        i = bisect.bisect_left(self.ranges, [start, start])
+        if i > 0 and self.ranges[i - 1][1] >= start:
+            i -= 1
+        # swallow every range it touches
+        j = i
+        while j < len(self.ranges) and self.ranges[j][0] <= end:
+            start = min(start, self.ranges[j][0])
+            end = max(end, self.ranges[j][1])
+            j += 1
+        self.ranges[i:j] = [[start, end]]
+
+    def clear(self):
+        self.ranges.clear()
+
+    def __iter__(self):
+        return iter([tuple(r) for r in self.ranges])
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __bool__(self):
+        return len(self.ranges) > 0
+# }}}2
+
+"""
+atomic_write(fname, stream)
+    fname   := path to the save file
+    stream  := "bytes-like" data stream, the whole new save
+
+Replaces `fname' with `stream' all at once: the new contents go to a
+    temp file next to it, get fsync'd (the only data fsync), and are
+    renamed over the old file. A crash leaves either the old save or
+    the new one, never a mix.
+"""
+def atomic_write(fname, stream): # {{{2
+    where = os.path.dirname(os.path.abspath(fname))
+    fd, tmp = tempfile.mkstemp(dir=where,
+                               prefix="." + os.path.basename(fname) + ".")
+    try:
+        # keep the old file's permissions
+        try:
+            os.chmod(tmp, os.stat(fname).st_mode & 0o7777)
+        except FileNotFoundError:
+            pass
+        with phase('write', fname), io.FileIO(fd, 'w') as f:
+            io_stats['written'] += f.write(stream)
+            os.fsync(f.fileno())
+        os.replace(tmp, fname)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    # make the rename itself stick
+    fsync_dir(where)
+    return
+# }}}2
+
+"""
+fsync_dir(where)
+    where   := path to a directory
+
+Makes renames, creates and deletes in `where' stick (not possible
+    everywhere, so errors are ignored).
+"""
+def fsync_dir(where): # {{{2
+    try:
+        dfd = os.open(where, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dfd)
+    except OSError:
+        pass
+    finally:
+        os.close(dfd)
+    return
+# }}}2
+
+"""
+journal_write(fname, stream, dirty)
+journal_replay(fname)
+    fname   := path to the save file
+    stream  := "bytes-like" data stream, the whole new save
+    dirty   := `DirtyRanges' of the bytes that changed
+
+returns:    journal_replay() => True if a journal was found and applied
+
+Partial writes that still can't leave a half-written save behind. The
+    dirty ranges (and their new bytes) go to `fname' + JOURNAL_EXT
+    first and get fsync'd; only then are they `pwrite()'n into the save
+    itself, which is fsync'd in turn before the journal is deleted.
+    A crash before the journal is complete leaves the save untouched
+    (the journal fails its digest and is thrown away); a crash after
+    leaves a journal that `journal_replay()' applies again, which is
+    harmless since it's the same bytes. `Transaction' replays any
+    leftover journal before reading the save.
+
+Journal layout: JOURNAL_MAGIC, then per range a little-endian (start,
+    length) pair of u32s and the bytes, then a SHA-1 of all that.
+"""
+def journal_write(fname, stream, dirty): # {{{2
+    view = memoryview(stream)
+    body = bytearray(JOURNAL_MAGIC)
+    for start, end in dirty:
+        body += JOURNAL_RANGE.pack(start, end - start)
+        body += view[start:end]
+    body += hashlib.sha1(body).digest()
+    jname = fname + JOURNAL_EXT
+    with phase('write', fname):
+        with io.FileIO(jname, 'w') as f:
+            io_stats['written'] += f.write(body)
+            os.fsync(f.fileno())
+        fsync_dir(os.path.dirname(os.path.abspath(fname)))
+        # journal's safe, now the save itself
+        with io.FileIO(fname, 'r+') as f:
+            for start, end in dirty:
+                io_stats['written'] += os.pwrite(f.fileno(),
+                                                 view[start:end], start)
+            os.fsync(f.fileno())
+        os.unlink(jname)
+    view.release()
+    return
+# }}}2
+def journal_replay(fname): # {{{2
+    jname = fname + JOURNAL_EXT
+    try:
+        with open(jname, 'rb') as f:
+            body = f.read()
+    except FileNotFoundError:
+        return False
+    digest = hashlib.sha1().digest_size
+    # torn journal? then the save was never touched
+    if (len(body) < len(JOURNAL_MAGIC) + digest or
+            not body.startswith(JOURNAL_MAGIC) or
+            hashlib.sha1(body[:-digest]).digest() != body[-digest:]):
+        os.unlink(jname)
+        return False
+    body = memoryview(body)[:-digest]
+    with io.FileIO(fname, 'r+') as f:
+        i = len(JOURNAL_MAGIC)
+        while i < len(body):
+            start, length = JOURNAL_RANGE.unpack_from(body, i)
+            i += JOURNAL_RANGE.size
+            io_stats['written'] += os.pwrite(f.fileno(),
+                                             body[i:i + length], start)
+            i += length
+        os.fsync(f.fileno())
+    os.unlink(jname)
+    return True
+# }}}2
+
+"""
+Transaction(fname)
+    fname   := path to the save file
+
+A group of edits to one save, committed all at once:
+
+        with Transaction("POKEGOLD.SAV") as txn:
+            txn.set_name('player_name', "GOLD")
+            txn['money'] = money_encode(999999)
+
+Edits land in an in-memory copy (`data') and are tracked in `dirty';
+    `versions' counts the writes to each field (by name), so anything
+    cached about a field is stale once its count goes up.
+    Like `SaveFile', `write()' keeps a running sum for each checksum,
+    adjusted by just the changed bytes (`rescan()' re-sums from
+    scratch). `commit()' stores the checksums from those and, if
+    anything changed, writes only the dirty ranges, through
+    `journal_write()': never a save on disk with mismatched checksums
+    or half an edit. If the file no longer holds what was loaded
+    (`stale()'), `commit()' raises `ValueError' and writes nothing:
+    our ranges patched into somebody else's save would match neither.
+    Leaving the `with' block on an exception rolls everything back
+    (i.e. nothing is written).
+"""
+class Transaction: # {{{2
+    def __init__(self, fname):
+        self.fname  = fname
+        # finish off a commit that got cut short
+        journal_replay(fname)
+        self.data   = bytearray(read_save(fname))
+        # what the file held, so `commit()' can tell if it moved on
+        self.digest = Transaction.digest_of(self.data)
+        self.dirty  = DirtyRanges()
+        self.versions = collections.Counter()
+        # running checksum sums (filled in by `rescan()' on first write)
+        self.sums   = None
+        self.done   = False
+
+    @staticmethod
+    def digest_of(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    def stale(self):
+        # somebody else (an emulator, say) saved over it since we read it
+        try:
+            return Transaction.digest_of(read_save(self.fname)) != self.digest
+        except FileNotFoundError:
+            return True
+
+    def rescan(self):
+        # sum every chunk of every checksum from scratch
+        self.sums = list()
+        for cs in save['checksum']:
+            n = 0
+            for chunk in cs['chunk']:
+                n += checksum(self.data[chunk['start']:chunk['end']])
+            self.sums.append(n)
+        return self.sums
+
+    def write(self, addr, data):
+        if self.done:
+            raise ValueError("transaction is already finished")
+        end = addr + len(data)
+        if addr < 0 or end > len(self.data):
+            raise IndexError("write past end of save")
+        if self.sums is None:
+            self.rescan()
+        data = memoryview(data).cast('B')
+        view = memoryview(self.data)
+        # only the overlap of the write with each chunk changes its sum
+        for i, cs in enumerate(save['checksum']):
+            for chunk in cs['chunk']:
+                lo = max(addr, chunk['start'])
+                hi = min(end, chunk['end'])
+                if lo < hi:
+                    self.sums[i] += (checksum(data[lo - addr:hi - addr]) -
+                                     checksum(view[lo:hi]))
+        view[addr:end] = data
+        view.release()
+        self.dirty.add(addr, end)
+        for f in schema.within(addr, end):
+            self.versions[f.name] += 1
+
+    def store_checksums(self):
+        if self.sums is None:
+            self.rescan()
+        for cs, n in zip(save['checksum'], self.sums):
+            # stored "little-endian" style, cut off at 2 bytes
+            dest = cs['addr']
+            if self.data[dest] | (self.data[dest + 1] << 8) == n & 0xffff:
+                continue
+            self.data[dest]     = n & 0x00ff
+            self.data[dest + 1] = (n & 0xff00) >> 8
+            self.dirty.add(dest, dest + CHECKSUM_SIZE)
+        return
+
+    def __getitem__(self, key):
+        return schema[key].view(self.data)
+
+    def __setitem__(self, key, data):
+        f = schema[key]
+        # checksums get fixed up by `commit()'
+        if f.type == TYPE_CHECKSUM:
+            raise KeyError(key)
+        # fields are fixed-size, don't spill into the next one
+        if len(data) > f.size:
+            raise ValueError("{} is only {} bytes".format(key, f.size))
+        self.write(f.addr, data)
+
+    def set_name(self, key, text):
+        # names are terminated, and only so long
+        data = str_encode(text)
+        if len(data) > REAL_NAME_SIZE:
+            raise ValueError("{!r} is longer than {} characters".format(
+                             text, REAL_NAME_SIZE))
+        self[key] = data + bytes((EON,))
+
+    def commit(self):
+        if self.done:
+            raise ValueError("transaction is already finished")
+        with phase('commit', self.fname):
+            # checksum fix-ups are part of the transaction, too
+            # (nothing written, nothing summed: nothing to fix)
+            if self.sums is not None:
+                self.store_checksums()
+            changed = bool(self.dirty)
+            # our ranges over their save would be neither, checksums and all
+            if changed and self.stale():
+                raise ValueError("{} changed on disk since it was "
+                                 "loaded".format(self.fname))
+            if changed:
+                journal_write(self.fname, self.data, self.dirty)
+                self.dirty.clear()
+        self.done = True
+        return changed
+
+    def rollback(self):
+        self.dirty.clear()
+        self.done = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, kind, exc, tb):
+        if self.done:
+            return False
+        if kind is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+# }}}2
+
+"""
+set_field(txn, key, value)
+    txn     := `Transaction' to make the edit in
+    key     := key into `save' (not a checksum)
+    value   := the new value as text: names as they read, money as a
+               number, the pokedex as species numbers ("1,4,7"), other
+               numbers comma separated, anything else as hex
+
+Raises `ValueError' for values that don't fit or can't be read.
+"""
+def set_field(txn, key, value): # {{{2
+    f = schema[key]
+    try:
+        if f.type == TYPE_NAME:
+            txn.set_name(key, value)
+        elif f.type == TYPE_MONEY:
+            money = int(value, 0)
+            if not 0 <= money <= MONEY_MAX:
+                raise ValueError("{} must be 0-{}".format(key, MONEY_MAX))
+            txn[key] = money_encode(money)
+        elif f.type == TYPE_TIME:
+            hours, minutes, seconds = (int(v, 0) for v in value.split(','))
+            if not (0 <= minutes < 60 and 0 <= seconds < 60):
+                raise ValueError("{} minutes and seconds must be "
+                                 "0-59".format(key))
+            txn[key] = time_encode((hours, minutes, seconds))
+        elif f.type == TYPE_POKEDEX:
+            txn[key] = Pokedex.from_species(int(v, 0)
+                                            for v in value.split(',')
+                                            if v.strip()).to_bytes()
+        elif f.st is not None:
+            txn[key] = f.st.pack(*(int(v, 0) for v in value.split(',')))
+        else:
+            txn[key] = bytes.fromhex(value)
+    # out of range for the field (dst=300, trainer_id=70000, ...)
+    except (struct.error, OverflowError) as e:
+        raise ValueError("bad value for {}: {}".format(key, e))
+    return
+# }}}2
+
+"""
+str_encode(text)
+str_decode(mem)
+    text    := string (or ASCII bytes) to encode
+    mem     := "bytes-like" data stream
+
+returns:    str_encode() => encoded bytes (no terminator added)
+            str_decode() => decoded string (stops at EON or 0x00)
+
+These two functions convert a PKMN proprietary string
+    back and forth into its ASCII equivalent.
 
 UPPER:    [0x41, 0x5a]    ==> PKMN: [$80, $99]
 lower:    [0x61, 0x7a]    ==> PKMN: [$A0, $B9]
 numbers:  [0x30, 0x39]    ==> PKMN: [$F6, $FF]
-specials: <see lookup table `special_char' below>
+specials: <see lookup table `special_char' above>
+
+Both go through the tables built by `build_codec()': decoding is a single
+    `str.translate()' over all 256 byte values. Encoding goes one letter
+    at a time, except for glyphs with no spelling of their own ("'s",
+    "'d" and friends), which are matched longest first. Letter tiles
+    like 'PO' and 'PK' decode fine but are spelled out when encoding.
+    Bytes with no glyph decode to `UNKNOWN_CHAR'; text that can't be
+    encoded raises `ValueError'.
 """
 
-def str_encode(mem): # {{{2
-    # turn bytes into a list
-    new = list()
+def str_encode(text): # {{{2
+    # ASCII bytes are fine, too
+    if not isinstance(text, str):
+        text = bytes(text).decode('ascii')
+    new = bytearray()
+    i = 0
     # ZOOOOOM
-    for c in mem:
-        # xlat char
-        x = 0x00
-        # UPPER
-        if c in range(0x41, 0x5A):
-            x = (c - 0x41) + 0x80
-        # lower
-        elif c in range(0x61, 0x7A):
-            x = (c - 0x61) + 0xA0
-        # numbers
-        elif c in range(0x30, 0x39):
-            x = (c - 0x30) + 0xF6
-        # special char?
+    while i < len(text):
+        # try the longest glyphs first
+        for n in range(min(ENCODE_MAX, len(text) - i), 0, -1):
+            x = encode_table.get(text[i:i + n])
+            if x is not None:
+                break
         else:
-            # is it in the list of values?
-            v = special_char.values()
-            k = special_char.keys()
-            for i in range(0, len(v)):
-                # get the key from its value
-                if v[i] is c:
-                    x = k[i]
-                    break
-        # append to end of list
+            raise ValueError("can't encode {!r}".format(text[i]))
         new.append(x)
-    # turn list back into byte array
+        i += n
     return bytes(new)
 # }}}2
 
 def str_decode(mem): # {{{2
-    # turn bytes into a list
-    new = list()
+    mem = bytes(mem)
+    # chop off at the terminator (or null)
+    end = mem.find(EON)
+    if end < 0:
+        end = len(mem)
+    null = mem.find(0x00, 0, end)
+    if null >= 0:
+        end = null
     # VWOOSH
-    for c in mem:
-        x = 0x00
-        # UPPER
-        if c in range(0x80, 0x99):
-            x = (c - 0x80) + 0x41
-        # lower
-        elif c in range(0xA0, 0xB9):
-            x = (c - 0xA0) + 0x61
-        # numbers
-        elif c in range(0xF6, 0xFF):
-            x = (c - 0xF6) + 0x30
-        # terminator or null?
-        elif c is 0x50 or c is 0x00:
-            break
-        # special char? use lookup table!
-        else:
-            x = special_char.get(c, 0x7E) # '~'
-            continue
-        # plop it onto the end
-        new.append(x)
-    # iterate through the list and turn any ASCII into raw hex
-    for c in new:
-        # is the current character ASCII?
-        continue
-
-    # WHIZZ BANG! KABLOOWIE!
-    # Have some bytes!  B-)
-    return bytes(new)
+    return mem[:end].decode('latin-1').translate(decode_table)
 # }}}2
 
 # TODO: -----------------------------------------
@@ -1150,22 +2431,400 @@ def str_decode(mem): # {{{2
 
 """
 Translate 3 byte money field into readable number
+    (big-endian, caps out at 999999 in-game)
 """
 def money_encode(data): # {{{2
-    return
+    return int(data).to_bytes(MONEY_SIZE, 'big')
 # }}}2
 def money_decode(data): # {{{2
-    return
+    return int.from_bytes(bytes(data[:MONEY_SIZE]), 'big')
 # }}}2
 
 """
 Translate 4 byte time data into readable number
+    (hours [2 bytes, big-endian], minutes, seconds)
 """
 def time_encode(data): # {{{2
-    return
+    hours, minutes, seconds = data
+    return int(hours).to_bytes(2, 'big') + bytes((minutes, seconds))
 # }}}2
 def time_decode(data): # {{{2
-    return
+    return ((data[0] << 8) | data[1], data[2], data[3])
+# }}}2
+
+"""
+summarize(stream)
+    stream      := "bytes-like" data stream
+
+returns:    `dict' of the headline facts about a save (JSON-friendly)
+
+Trainer ID, player/rival names, money, badges, time played, pokedex
+    counts, checksum validity and the species in the party.
+"""
+def summarize(stream): # {{{2
+    view = memoryview(stream)
+    if len(view) < checksum_span():
+        raise ValueError("file is too short")
+    def field(k):
+        return view[schema[k].addr:schema[k].end]
+    party = field('pokemon_party')
+    badges = field('johto_badges')[0]
+    out = {
+            'trainer_id':   int.from_bytes(field('trainer_id'), 'big'),
+            'player_name':  str_decode(field('player_name')),
+            'rival_name':   str_decode(field('rival_name')),
+            'money':        money_decode(field('money')),
+            'johto_badges': bin(badges).count('1'),
+            'time_played':  time_decode(field('time_played')),
+            'pokedex_owned': len(Pokedex.from_bytes(field('pokedex_owned'))),
+            'pokedex_seen': len(Pokedex.from_bytes(field('pokedex_seen'))),
+            'checksum_ok':  all(stored == computed for _, stored, computed
+                                in checksum_status(view)),
+            'party':        list(party[1:1 + min(party[0], PARTY_MAX)]),
+    }
+    view.release()
+    return out
+# }}}2
+
+"""
+field_value(key, mem)
+    key     := key into `save'
+    mem     := "bytes-like" contents of the field
+
+returns:    the field decoded into something JSON-friendly
+            (raw fields come back as a hex string)
+"""
+def field_value(key, mem): # {{{2
+    f = schema[key]
+    # encoded strings get decoded
+    if f.type == TYPE_NAME:
+        return str_decode(mem)
+    elif f.type == TYPE_MONEY:
+        return money_decode(mem)
+    # species numbers in the pokedex
+    elif f.type == TYPE_POKEDEX:
+        return list(Pokedex.from_bytes(mem))
+    elif f.type == TYPE_BOXNAMES:
+        return [str_decode(mem[i:i + BOX_NAME_SIZE])
+                for i in range(0, f.size, BOX_NAME_SIZE)]
+    # the rest of the numbers have a `struct' format
+    elif f.st is not None:
+        v = f.st.unpack_from(mem)
+        return v[0] if len(v) == 1 else list(v)
+    # raw bytes = raw attitude
+    return bytes(mem).hex()
+# }}}2
+
+"""
+regions()
+
+returns:    list of (name, start, end), every field of `save' in address
+            order, with each checksum word as 'checksum[N]'
+"""
+def regions(): # {{{2
+    return [(f.name, f.addr, f.end)
+            for f in sorted(schema, key=lambda f: f.addr)]
+# }}}2
+
+"""
+subregions(key)
+    key     := key into `save'
+
+returns:    list of (name, start, end) relative to the field, or None
+
+Pokemon lists split further: the count and species list ('header'),
+    each pokemon record ('mon[N]'), and the two name tables.
+"""
+def subregions(key): # {{{2
+    for k, cap, cls in pokelists():
+        if k != key:
+            continue
+        first = 1 + cap + 1
+        out = [('header', 0, first)]
+        for i in range(0, cap):
+            at = first + (i * cls.size)
+            out.append(('mon[{}]'.format(i), at, at + cls.size))
+        nicks = save[key]['size'] - (cap * NAME_SIZE)
+        ots = nicks - (cap * NAME_SIZE)
+        out.append(('ot_names', ots, nicks))
+        out.append(('nicknames', nicks, save[key]['size']))
+        return out
+    return None
+# }}}2
+
+"""
+merkle(stream)
+    stream      := "bytes-like" data stream
+
+returns:    hash tree of the save, as
+                {'hash': root, 'regions': {name: (hash, children)}}
+            where `children' is {part: hash} for pokemon lists, else None
+
+Every region is hashed once; a pokemon list's hash is the hash of its
+    parts' hashes and the root is the hash of all region hashes. Trees
+    can be kept around (i.e. per save in a corpus) so later diffs don't
+    need to read the saves at all until something differs.
+"""
+def merkle(stream): # {{{2
+    view = memoryview(stream)
+    def h(data):
+        return hashlib.blake2b(data, digest_size=16).digest()
+    tree = {'regions': dict()}
+    root = hashlib.blake2b(digest_size=16)
+    for name, start, end in regions():
+        parts = subregions(name)
+        if parts is None:
+            digest, children = h(view[start:end]), None
+        else:
+            children = {p: h(view[start + a:start + b]) for p, a, b in parts}
+            digest = h(b''.join(children.values()))
+        tree['regions'][name] = (digest, children)
+        root.update(digest)
+    tree['hash'] = root.digest()
+    view.release()
+    return tree
+# }}}2
+
+"""
+diff(old, new, old_tree=None, new_tree=None)
+    old, new            := "bytes-like" data streams
+    old_tree, new_tree  := trees from `merkle()' (computed if not given)
+
+returns:    list of changes, each a `dict':
+                'region'    := key into `save' (or 'checksum[N]')
+                'part'      := part of a pokemon list, or None
+                'addr'      := where the changed bytes start
+                'old'/'new' := decoded values
+
+Walks the two hash trees top-down: identical saves stop at the root,
+    identical regions (and pokemon records) are skipped without looking
+    at their bytes. Only what changed gets decoded, names thru
+    `str_decode()', pokemon thru `BoxPokemon.unpack()', and so on.
+Raises `ValueError' if either save is too short to hold every field.
+"""
+def diff(old, new, old_tree=None, new_tree=None): # {{{2
+    if min(len(old), len(new)) < checksum_span():
+        raise ValueError("file is too short")
+    if old_tree is None:
+        old_tree = merkle(old)
+    if new_tree is None:
+        new_tree = merkle(new)
+    changes = list()
+    # nothing to see here
+    if old_tree['hash'] == new_tree['hash']:
+        return changes
+    def decode(name, part, mem):
+        if name.startswith('checksum'):
+            return mem[0] | (mem[1] << 8)
+        if part is None:
+            return field_value(name, mem)
+        if part.startswith('mon['):
+            cls = Pokemon if len(mem) == POKEMON_SIZE else BoxPokemon
+            return cls(mem).unpack()
+        if part.endswith('names'):
+            return [str_decode(mem[i:i + NAME_SIZE])
+                    for i in range(0, len(mem), NAME_SIZE)]
+        return list(mem)
+    a, b = memoryview(old), memoryview(new)
+    for name, start, end in regions():
+        digest, children = old_tree['regions'][name]
+        if digest == new_tree['regions'][name][0]:
+            continue
+        if children is None:
+            parts = [(None, start, end)]
+        else:
+            theirs = new_tree['regions'][name][1]
+            parts = [(p, start + x, start + y) for p, x, y in subregions(name)
+                     if children[p] != theirs[p]]
+        for part, lo, hi in parts:
+            was, now = decode(name, part, a[lo:hi]), decode(name, part,
+                                                              b[lo:hi])
+            # only the pokemon fields that changed
+            if isinstance(was, dict):
+                keep = [f for f in was.keys() if was[f] != now[f]]
+                was = {f: was[f] for f in keep}
+                now = {f: now[f] for f in keep}
+            changes.append({'region': name, 'part': part, 'addr': lo,
+                            'old': was, 'new': now})
+    return changes
+# }}}2
+
+"""
+partition(size)
+    size    := size of the save (in bytes)
+
+returns:    list of (name, start, end) covering every byte of [0, size)
+
+The regions from `regions()', with whatever lies between (and after)
+    them as 'gap@XXXX' chunks, so a save can be rebuilt from its parts.
+"""
+def partition(size): # {{{2
+    out = list()
+    at = 0
+    for name, start, end in regions():
+        start, end = max(start, at), min(end, size)
+        if start >= end:
+            continue
+        if at < start:
+            out.append(('gap@{:04x}'.format(at), at, start))
+        out.append((name, start, end))
+        at = end
+    if at < size:
+        out.append(('gap@{:04x}'.format(at), at, size))
+    return out
+# }}}2
+
+"""
+snapshot_chunks(size)
+    size    := size of the save (in bytes)
+
+returns:    list of (name, start, end) covering every byte of [0, size)
+
+`partition()', with runs of small neighbouring regions merged until each
+    chunk is at least SNAPSHOT_CHUNK bytes (named after the first region
+    in it). A two-byte checksum or a three-byte money field isn't worth
+    its own hash and index entry.
+"""
+def snapshot_chunks(size): # {{{2
+    out = list()
+    for name, start, end in partition(size):
+        if out and out[-1][2] - out[-1][1] < SNAPSHOT_CHUNK:
+            out[-1] = (out[-1][0], out[-1][1], end)
+        else:
+            out.append((name, start, end))
+    return out
+# }}}2
+
+"""
+SnapshotStore(root)
+    root    := directory to keep the snapshots in (created if missing)
+
+A content-addressed archive of saves. Each save is cut up along
+    `snapshot_chunks()', and every chunk is stored once under its hash,
+    appended to a single pack file:
+
+        root/pack                   chunk contents, back to back
+        root/pack.idx               "hash offset length" line per chunk
+        root/snapshots/NAME.json    size + (name, start, end, hash) list
+
+Saves change slowly, so a new snapshot usually only appends the handful
+    of chunks that changed (and a line each to the index). New chunks
+    hit the pack (fsync'd) before the index, and the index before the
+    manifest, so a crash at worst leaves unused bytes at the end of the
+    pack (ignored) or half an index line (cut off when the store is
+    next opened).
+    `restore()' into an existing save likewise only reads (and writes)
+    the chunks that differ, adding each one it patched to `dirty' (a
+    `DirtyRanges') if given.
+"""
+class SnapshotStore: # {{{2
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(os.path.join(root, 'snapshots'), exist_ok=True)
+        self.pack_path = os.path.join(root, 'pack')
+        self.index_path = os.path.join(root, 'pack.idx')
+        # hash => (offset, length) in the pack
+        self.index = dict()
+        try:
+            packed = os.path.getsize(self.pack_path)
+            with open(self.index_path, 'r+b') as f:
+                lines = f.read()
+                # half a line at the end? cut it off, or the next
+                # `snapshot()' would append onto it
+                end = lines.rfind(b'\n') + 1
+                if end < len(lines):
+                    f.truncate(end)
+                    lines = lines[:end]
+        except FileNotFoundError:
+            lines = b''
+        for line in lines.decode('ascii', 'replace').splitlines():
+            try:
+                h, at, n = line.split()
+                at, n = int(at), int(n)
+            except ValueError:
+                continue
+            # torn write? the chunk isn't really there
+            if at + n <= packed:
+                self.index[h] = (at, n)
+
+    @staticmethod
+    def digest(data):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def manifest_path(self, name):
+        return os.path.join(self.root, 'snapshots', name + '.json')
+
+    def put(self, path, data):
+        # write-then-rename, so nobody ever sees half a file
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def snapshot(self, stream, name):
+        view = memoryview(stream)
+        chunks = list()
+        new = dict()
+        for part, start, end in snapshot_chunks(len(view)):
+            h = self.digest(view[start:end])
+            # already have it? that's the whole point
+            if h not in self.index:
+                new[h] = view[start:end]
+            chunks.append((part, start, end, h))
+        written = 0
+        if new:
+            lines = list()
+            with open(self.pack_path, 'ab') as f:
+                at = f.seek(0, io.SEEK_END)
+                for h, data in new.items():
+                    f.write(data)
+                    self.index[h] = (at, len(data))
+                    lines.append("{} {} {}\n".format(h, at, len(data)))
+                    at += len(data)
+                    written += len(data)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.index_path, 'a') as f:
+                f.write(''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+        view.release()
+        manifest = {'size': len(stream), 'chunks': chunks}
+        self.put(self.manifest_path(name), json.dumps(manifest).encode())
+        return written
+
+    def manifest(self, name):
+        with open(self.manifest_path(name)) as f:
+            return json.load(f)
+
+    def snapshots(self):
+        names = os.listdir(os.path.join(self.root, 'snapshots'))
+        return sorted(n[:-5] for n in names if n.endswith('.json'))
+
+    def restore(self, name, into=None, dirty=None):
+        m = self.manifest(name)
+        # from scratch: every chunk gets read
+        if into is None:
+            into = bytearray(m['size'])
+        elif len(into) != m['size']:
+            raise ValueError("snapshot is {} bytes, not {}".format(
+                             m['size'], len(into)))
+        view = memoryview(into)
+        with open(self.pack_path, 'rb') as f:
+            for part, start, end, h in m['chunks']:
+                # skip whatever already matches
+                if self.digest(view[start:end]) == h:
+                    continue
+                if h not in self.index:
+                    raise ValueError("chunk {} of {} is missing".format(
+                                     part, name))
+                at, n = self.index[h]
+                view[start:end] = os.pread(f.fileno(), n, at)
+                if dirty is not None:
+                    dirty.add(start, end)
+        view.release()
+        return into
 # }}}2
 
 """
@@ -1178,14 +2837,570 @@ def options_decode(data): # {{{2
     return
 # }}}2
 
+"""
+Pokedex(bits=0)
+    bits    := the pokedex as an `int', bit N-1 set for species N
+
+A pokedex (seen or owned) as an immutable bitset of species numbers
+    (1 to POKEDEX_COUNT). Stored in the save least significant bit first,
+    so the 32 bytes are just a little-endian integer:
+
+        dex = Pokedex.from_bytes(txn['pokedex_owned'])
+        len(dex), 25 in dex, list(seen - dex)
+        txn['pokedex_owned'] = dex.set(152, 155, 158).to_bytes()
+"""
+class Pokedex: # {{{2
+    __slots__ = ('bits',)
+    # only these bits mean anything
+    MASK = (1 << POKEDEX_COUNT) - 1
+
+    def __init__(self, bits=0):
+        self.bits = bits & self.MASK
+
+    @classmethod
+    def from_bytes(cls, mem):
+        return cls(int.from_bytes(mem, 'little'))
+
+    @classmethod
+    def from_species(cls, species):
+        return cls().set(*species)
+
+    def to_bytes(self):
+        return self.bits.to_bytes(POKEDEX_SIZE, 'little')
+
+    def to_array(self):
+        if np is None:
+            raise ImportError("Pokedex.to_array() requires NumPy")
+        bits = np.frombuffer(self.to_bytes(), dtype=np.uint8)
+        return np.unpackbits(bits, bitorder='little')[:POKEDEX_COUNT]
+
+    @staticmethod
+    def bit(species):
+        if not 1 <= species <= POKEDEX_COUNT:
+            raise ValueError("no such species: {}".format(species))
+        return 1 << (species - 1)
+
+    def set(self, *species):
+        bits = self.bits
+        for n in species:
+            bits |= self.bit(n)
+        return Pokedex(bits)
+
+    def clear(self, *species):
+        bits = self.bits
+        for n in species:
+            bits &= ~self.bit(n)
+        return Pokedex(bits)
+
+    def __contains__(self, species):
+        return 1 <= species <= POKEDEX_COUNT and \
+               (self.bits >> (species - 1)) & 1 == 1
+
+    def __iter__(self):
+        # lowest set bit each time around
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield low.bit_length()
+            bits ^= low
+
+    def __len__(self):
+        return bin(self.bits).count('1')
+
+    def __or__(self, other):
+        return Pokedex(self.bits | other.bits)
+
+    def __and__(self, other):
+        return Pokedex(self.bits & other.bits)
+
+    def __sub__(self, other):
+        return Pokedex(self.bits & ~other.bits)
+
+    def __xor__(self, other):
+        return Pokedex(self.bits ^ other.bits)
+
+    def __eq__(self, other):
+        return isinstance(other, Pokedex) and self.bits == other.bits
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def __repr__(self):
+        return "Pokedex({})".format(list(self))
+# }}}2
+
+"""
+pokedex_batch(streams, key='pokedex_owned')
+    streams := "bytes-like" saves, or a 2D `numpy.ndarray' with one per row
+    key     := 'pokedex_owned' or 'pokedex_seen'
+
+returns:    (counts, frequency): for each species (index 0 is species 1),
+            how many saves have its bit set, and what fraction of them
+
+Stacks every save's pokedex bits and counts them all in one pass, NumPy
+    only. Rows only need to reach the end of the pokedex field.
+"""
+def pokedex_batch(streams, key='pokedex_owned'): # {{{2
+    if np is None:
+        raise ImportError("pokedex_batch() requires NumPy")
+    f = schema[key]
+    # stack the saves (if they aren't already)
+    if isinstance(streams, np.ndarray):
+        rows = streams
+    else:
+        rows = np.stack([np.frombuffer(s, dtype=np.uint8, count=f.end)
+                         for s in streams])
+    if rows.ndim != 2 or rows.shape[1] < f.end:
+        raise ValueError("saves must be at least {} bytes".format(f.end))
+    # one bit per column, least significant first (like the game)
+    bits = np.unpackbits(rows[:, f.addr:f.end], axis=1,
+                         bitorder='little')[:, :POKEDEX_COUNT]
+    counts = bits.sum(axis=0, dtype=np.int64)
+    return counts, counts / max(len(rows), 1)
+# }}}2
+
+"""
+pokelist_names(mem, capacity)
+    mem         := "bytes-like" pokemon list (party or box)
+    capacity    := most pokemon the list can hold (PARTY_MAX, BOX_MAX)
+
+returns:    (count, OT names offset, nicknames offset)
+
+A pokemon list ends with two tables of `capacity' names each, the
+    OT names followed by the nicknames. The count is the first byte.
+"""
+def pokelist_names(mem, capacity): # {{{2
+    nicks   = len(mem) - (capacity * NAME_SIZE)
+    ots     = nicks - (capacity * NAME_SIZE)
+    return min(mem[0], capacity), ots, nicks
+# }}}2
+
+"""
+iter_names(stream)
+    stream      := "bytes-like" data stream
+
+yields:     (location, raw, text)
+                location    := (key, kind, index), i.e.
+                                   ('pokemon_box_3', 'nickname', 4)
+                raw         := `memoryview' of the whole name field
+                text        := decoded with `str_decode()'
+
+Walks every EON-terminated name in the save once, in address order:
+    player/rival names, PC box names, then the OT names and nicknames
+    of each pokemon in the party, the current box and every PC box.
+    `raw' is a slice of `stream', nothing is copied.
+"""
+def iter_names(stream): # {{{2
+    view = memoryview(stream)
+    for f in schema:
+        k = f.name
+        # player, rival
+        if f.type == TYPE_NAME:
+            raw = view[f.addr:f.end]
+            yield (k, 'name', 0), raw, str_decode(raw)
+        # the names of every box in BILL's PC
+        elif f.type == TYPE_BOXNAMES:
+            for i in range(0, PC_BOX_COUNT):
+                at  = f.addr + (i * BOX_NAME_SIZE)
+                raw = view[at:at + BOX_NAME_SIZE]
+                yield (k, 'box_name', i), raw, str_decode(raw)
+        # pokemon lists
+        elif f.type == TYPE_POKELIST or f.type == TYPE_POKEBOX:
+            mem = view[f.addr:f.end]
+            cap = PARTY_MAX if f.type == TYPE_POKELIST else BOX_MAX
+            count, ots, nicks = pokelist_names(mem, cap)
+            for kind, base in (('ot_name', ots), ('nickname', nicks)):
+                for i in range(0, count):
+                    at  = base + (i * NAME_SIZE)
+                    raw = mem[at:at + NAME_SIZE]
+                    yield (k, kind, i), raw, str_decode(raw)
+    return
+# }}}2
+
+"""
+PokeField(offset, fmt)
+    offset  := offset of the field in the pokemon structure
+    fmt     := `struct' format of the field (big-endian)
+
+Descriptor for one field of `pokemon', compiled once into a
+    `struct.Struct'. Reads unpack straight from the underlying buffer
+    and writes pack straight back into it (through `SaveFile.write()'
+    if there is one, so the checksums stay correct).
+"""
+class PokeField: # {{{2
+    __slots__ = ('offset', 'st', 'count')
+
+    def __init__(self, offset, fmt):
+        self.offset = offset
+        self.st     = struct.Struct('>' + fmt)
+        # multi-value fields are tuples, the rest are plain ints
+        self.count  = len(self.st.unpack(bytes(self.st.size)))
+
+    def value(self, v):
+        # turn unpacked value(s) into what the caller sees
+        return v if self.count > 1 else v[0]
+
+    def __get__(self, mon, owner=None):
+        if mon is None:
+            return self
+        return self.value(self.st.unpack_from(mon.buf,
+                                              mon.offset + self.offset))
+
+    def __set__(self, mon, value):
+        value = tuple(value) if self.count > 1 else (value,)
+        if mon.sf is not None:
+            mon.sf.write(mon.offset + self.offset, self.st.pack(*value))
+        else:
+            self.st.pack_into(mon.buf, mon.offset + self.offset, *value)
+# }}}2
+
+# 24-bit big-endian values (exp), there's no `struct' format for those
+class PokeField24(PokeField): # {{{2
+    __slots__ = ()
+
+    def value(self, v):
+        return int.from_bytes(v[0], 'big')
+
+    def __set__(self, mon, value):
+        PokeField.__set__(self, mon, int(value).to_bytes(3, 'big'))
+# }}}2
+
+"""
+BoxPokemon(buf, offset=0)
+Pokemon(buf, offset=0)
+    buf     := "bytes-like" (writable to edit) or a `SaveFile'
+    offset  := where the pokemon structure starts in `buf'
+
+A pokemon record living in someone else's memory. Fields from `pokemon'
+    are read lazily, nothing is unpacked or copied up-front:
+
+        mon = Pokemon(party_mem, 8)
+        mon.level += 1
+
+`BoxPokemon' has the fields common to BILL's PC (BOXMON_SIZE bytes),
+    `Pokemon' adds the party-only status, HP and stats.
+"""
+class BoxPokemon: # {{{2
+    __slots__ = ('buf', 'offset', 'sf')
+    size = BOXMON_SIZE
+
+    def __init__(self, buf, offset=0):
+        # a `SaveFile' routes writes thru `write()' for the checksums
+        if isinstance(buf, SaveFile):
+            self.sf     = buf
+            self.buf    = buf.buf
+        else:
+            self.sf     = None
+            self.buf    = buf
+        self.offset = offset
+
+    def unpack(self):
+        # every field at once, in one go
+        values  = self.record.unpack_from(self.buf, self.offset)
+        out     = dict()
+        i       = 0
+        for name, field in self.fields:
+            out[name] = field.value(values[i:i + field.count])
+            i += field.count
+        return out
+
+    def __repr__(self):
+        return "<{} species=0x{:02x} level={} @ 0x{:04x}>".format(
+                type(self).__name__, self.species, self.level, self.offset)
+# }}}2
+
+class Pokemon(BoxPokemon): # {{{2
+    __slots__ = ()
+    size = POKEMON_SIZE
+# }}}2
+
+"""
+compile_pokemon(cls)
+    cls     := `BoxPokemon' or `Pokemon'
+
+returns:    `cls'
+
+Attaches a `PokeField' for each entry of `pokemon' that fits in
+    `cls.size', plus one `struct.Struct' (`cls.record') covering the
+    whole record, used by `unpack()'.
+"""
+def compile_pokemon(cls): # {{{2
+    fmt     = '>'
+    fields  = list()
+    at      = 0
+    for name, (offset, f) in sorted(pokemon.items(), key=lambda i: i[1][0]):
+        field = PokeField24(offset, f) if f == '3s' else PokeField(offset, f)
+        if offset + field.st.size > cls.size:
+            continue
+        setattr(cls, name, field)
+        # pad out any unused bytes
+        fmt += ('x' * (offset - at)) + f
+        at = offset + field.st.size
+        fields.append((name, field))
+    fmt += 'x' * (cls.size - at)
+    cls.record = struct.Struct(fmt)
+    cls.fields = tuple(fields)
+    return cls
+# }}}2
+compile_pokemon(BoxPokemon)
+compile_pokemon(Pokemon)
+
+"""
+pokelist_decode(data, capacity, cls, base=0)
+    data        := "bytes-like" (writable to edit) or a `SaveFile'
+    capacity    := most pokemon the list can hold (PARTY_MAX, BOX_MAX)
+    cls         := `Pokemon' or `BoxPokemon'
+    base        := where the list starts in `data'
+
+returns:    list of `cls', one per pokemon in the list
+
+The pokemon structures follow the count and the species list
+    (`capacity' species, plus a terminator).
+"""
+def pokelist_decode(data, capacity, cls, base=0): # {{{2
+    buf     = data.buf if isinstance(data, SaveFile) else data
+    count   = min(buf[base], capacity)
+    first   = base + 1 + capacity + 1
+    return [cls(data, first + (i * cls.size)) for i in range(0, count)]
+# }}}2
+
 """
 Translate pokeparty into individual pokemon
 """
 def pokeparty_encode(data): # {{{2
-    return
+    # `Pokemon' writes land in `data' as they happen, nothing to do
+    return data
 # }}} 2
-def pokeparty_decode(data): # {{{2
-    return
+def pokeparty_decode(data, base=0): # {{{2
+    return pokelist_decode(data, PARTY_MAX, Pokemon, base)
+# }}}2
+
+"""
+pokebox_dtype()
+
+returns:    NumPy structured dtype of one box in BILL's PC
+
+    'count'     := u1, pokemon in the box
+    'species'   := u1 x (BOX_MAX + 1), species list (plus terminator)
+    'mons'      := BOX_MAX pokemon records, one field per `pokemon'
+                   entry that fits in BOXMON_SIZE ('exp' is 3 raw bytes,
+                   see `exp24()')
+    'ot_names'  := u1 x (BOX_MAX, NAME_SIZE)
+    'nicknames' := u1 x (BOX_MAX, NAME_SIZE)
+
+Requires NumPy.
+"""
+def pokebox_dtype(): # {{{2
+    if np is None:
+        raise ImportError("pokebox_dtype() requires NumPy")
+    # `struct' => NumPy formats (big-endian)
+    kinds = {'B': 'u1', 'H': '>u2', 's': 'u1'}
+    names, formats, offsets = list(), list(), list()
+    for name, (offset, f) in pokemon.items():
+        if offset >= BOXMON_SIZE:
+            continue
+        n = int(f[:-1]) if len(f) > 1 else 1
+        names.append(name)
+        formats.append((kinds[f[-1]], n) if n > 1 else kinds[f[-1]])
+        offsets.append(offset)
+    mon = np.dtype({'names': names, 'formats': formats,
+                    'offsets': offsets, 'itemsize': BOXMON_SIZE})
+    # count, species list, pokemon, then the two name tables
+    mons = 1 + BOX_MAX + 1
+    ots = mons + (BOX_MAX * BOXMON_SIZE)
+    nicks = ots + (BOX_MAX * NAME_SIZE)
+    return np.dtype({
+            'names':    ['count', 'species', 'mons', 'ot_names', 'nicknames'],
+            'formats':  ['u1', ('u1', BOX_MAX + 1), (mon, BOX_MAX),
+                         ('u1', (BOX_MAX, NAME_SIZE)),
+                         ('u1', (BOX_MAX, NAME_SIZE))],
+            'offsets':  [0, 1, mons, ots, nicks],
+            'itemsize': POKEBOX_SIZE,
+    })
+# }}}2
+
+"""
+pc_boxes(stream)
+    stream  := "bytes-like" data stream (writable to edit)
+
+returns:    NumPy array of `pokebox_dtype()', shape (banks, boxes per bank)
+
+Maps all of the `pokemon_box_N' regions at once, zero-copy. The boxes
+    sit in two SRAM banks with the same stride between boxes, so the
+    array is 2-D (2 x 7 for Gold/Silver); box N is `.flat[N - 1]'.
+    Any query over every stored pokemon is then one vectorized
+    operation, i.e.
+
+        boxes = pc_boxes(sf.buf)
+        box_where(boxes, boxes['mons']['level'] >= 50)
+
+Writes into the array land in `stream' directly; checksums have to be
+    fixed up afterwards (`validate()'). For a `SaveFile', mark the boxes
+    with `mark_dirty()' and then `store_checksums()'.
+
+Requires NumPy.
+"""
+def pc_boxes(stream): # {{{2
+    dtype = pokebox_dtype()
+    addrs = [save['pokemon_box_{}'.format(i)]['addr']
+             for i in range(1, PC_BOX_COUNT + 1)]
+    # boxes per bank share a stride, and so do the banks
+    step = addrs[1] - addrs[0]
+    per = 1
+    while per < len(addrs) and addrs[per] - addrs[per - 1] == step:
+        per += 1
+    bank = addrs[per] - addrs[0] if per < len(addrs) else 0
+    for i, a in enumerate(addrs):
+        if a != addrs[0] + ((i // per) * bank) + ((i % per) * step):
+            raise ValueError("PC boxes aren't evenly spaced")
+    return np.ndarray((len(addrs) // per, per), dtype=dtype, buffer=stream,
+                      offset=addrs[0], strides=(bank, step))
+# }}}2
+
+"""
+box_occupied(boxes)
+    boxes   := array from `pc_boxes()'
+
+returns:    bool array (..., BOX_MAX), True where a slot holds a pokemon
+"""
+def box_occupied(boxes): # {{{2
+    count = np.minimum(boxes['count'], BOX_MAX)
+    return np.arange(BOX_MAX) < count[..., np.newaxis]
+# }}}2
+
+"""
+box_where(boxes, mask)
+    boxes   := array from `pc_boxes()'
+    mask    := bool array (..., BOX_MAX), i.e. from a query on boxes['mons']
+
+returns:    list of (box number, slot) for occupied slots matching `mask'
+"""
+def box_where(boxes, mask): # {{{2
+    banks, slots = np.nonzero((mask & box_occupied(boxes)).reshape(-1,
+                                                                   BOX_MAX))
+    return [(int(b) + 1, int(s)) for b, s in zip(banks, slots)]
+# }}}2
+
+"""
+pokelists()
+
+returns:    list of (key, capacity, cls) for every pokemon list in `save'
+
+The party, the current box and every box in BILL's PC, in that order.
+"""
+def pokelists(): # {{{2
+    lists = [('pokemon_party', PARTY_MAX, Pokemon),
+             ('pokemon_cur_box', BOX_MAX, BoxPokemon)]
+    for i in range(1, PC_BOX_COUNT + 1):
+        lists.append(('pokemon_box_{}'.format(i), BOX_MAX, BoxPokemon))
+    return lists
+# }}}2
+
+"""
+SaveIndex(data)
+    data    := "bytes-like" data stream or a `SaveFile'
+
+Where's my Pikachu? An index from species, OT ID, nickname and held item
+    to the (key, slot) of every pokemon in the party, the current box and
+    all of BILL's PC, i.e.
+
+        index = SaveIndex(sf)
+        index.find(species=25)      => {('pokemon_box_3', 7)}
+
+Built once with a single pass over every pokemon list; after that,
+    lookups are dict hits. Call `update()' after editing a slot,
+    `move()' after moving one, and `release()' after releasing one.
+    Lists are kept packed, so the slots after a pokemon taken out (or
+    put in) all shift; those get re-read, and any past the new count
+    are forgotten.
+"""
+class SaveIndex: # {{{2
+    # what can be looked up
+    attrs = ('species', 'ot_id', 'nickname', 'item')
+
+    def __init__(self, data):
+        self.data   = data
+        self.buf    = data.buf if isinstance(data, SaveFile) else data
+        # attr => value => set of (key, slot)
+        self.by     = {a: dict() for a in self.attrs}
+        # (key, slot) => values, in `attrs' order
+        self.slots  = dict()
+        # key => (capacity, cls)
+        self.lists  = {k: (cap, cls) for k, cap, cls in pokelists()}
+        for k in self.lists.keys():
+            self.refresh(k)
+
+    def read(self, key, slot):
+        # current values for a slot, or None if it's empty
+        cap, cls = self.lists[key]
+        base = schema[key].addr
+        mem = schema[key].view(self.buf)
+        count, ots, nicks = pokelist_names(mem, cap)
+        if slot >= count:
+            return None
+        mon = cls(self.buf, base + 1 + cap + 1 + (slot * cls.size))
+        at = nicks + (slot * NAME_SIZE)
+        return (mon.species, mon.ot_id, str_decode(mem[at:at + NAME_SIZE]),
+                mon.item)
+
+    def update(self, key, slot):
+        loc = (key, slot)
+        # forget what used to be there
+        old = self.slots.pop(loc, None)
+        if old is not None:
+            for a, v in zip(self.attrs, old):
+                hits = self.by[a][v]
+                hits.discard(loc)
+                if len(hits) == 0:
+                    del self.by[a][v]
+        # and remember what is there now
+        new = self.read(key, slot)
+        if new is not None:
+            self.slots[loc] = new
+            for a, v in zip(self.attrs, new):
+                self.by[a].setdefault(v, set()).add(loc)
+        return new
+
+    def refresh(self, key, first=0):
+        for slot in range(first, self.lists[key][0]):
+            self.update(key, slot)
+
+    def move(self, src, dst):
+        # both are (key, slot): taking it out shifts the rest of its list
+        # up, putting it in shifts the rest of the other one down
+        if src[0] == dst[0]:
+            self.refresh(src[0], min(src[1], dst[1]))
+        else:
+            self.refresh(*src)
+            self.refresh(*dst)
+
+    def release(self, key, slot):
+        self.refresh(key, slot)
+
+    def find(self, **query):
+        # every location matching all of `query' (attr=value)
+        hits = None
+        for a, v in query.items():
+            if a not in self.by:
+                raise KeyError(a)
+            found = self.by[a].get(v, set())
+            hits = set(found) if hits is None else (hits & found)
+        return hits if hits is not None else set(self.slots.keys())
+
+    def __getitem__(self, loc):
+        # values stored at (key, slot) as a dict
+        return dict(zip(self.attrs, self.slots[loc]))
+# }}}2
+
+"""
+exp24(exp)
+    exp     := u1 array (..., 3), i.e. boxes['mons']['exp']
+
+returns:    u4 array of the 24-bit big-endian values
+"""
+def exp24(exp): # {{{2
+    exp = exp.astype(np.uint32)
+    return (exp[..., 0] << 16) | (exp[..., 1] << 8) | exp[..., 2]
 # }}}2
 
 """
@@ -1200,8 +3415,16 @@ Computes and returns an "index" from `struct[key]`
 Since `dict' (python >= 3.x) guarantees sequential and contiguous
     data placement, this should be considered as pointing to the
     same region of said `dict'.
+
+Lookups in `save' go through the compiled `schema' in O(1).
 """
 def key2index(struct, key): # {{{2
+    # the save layout is compiled, no need to go looking
+    if struct is save:
+        # `checksum' sits where its first word does
+        if key == 'checksum':
+            key = 'checksum[0]'
+        return schema.index(key) if key in schema else None
     # position of key -> struct
     index = 0
     # iterate through structure looking for key
@@ -1225,8 +3448,17 @@ index2key(struct, index)
 returns:    key for which index points to, or None if NOT found!
 
 Computes and returns the key from which `struct(index)' was derived.
+Lookups in `save' go through the compiled `schema' in O(1).
 """
 def index2key(struct, index): # {{{2
+    # the save layout is compiled, no need to go looking
+    if struct is save:
+        if index < 0 or index >= len(schema):
+            return None
+        f = schema[index]
+        if f.type == TYPE_CHECKSUM:
+            return 'checksum' if f.name == 'checksum[0]' else None
+        return f.name
     # iteration var
     i = 0
     # walk thru keys
@@ -1291,7 +3523,7 @@ def shutdown(code=ERR_NONE, msg=None): # {{{2
     curses_close()
     # if error present, print message
     if code is not ERR_NONE:
-        print("err [{}]: {}", code, msg)
+        print("err [{}]: {}".format(code, msg))
 
     # ...time for us to blow this popsicle stand...
     sys.exit(code)
@@ -1305,7 +3537,7 @@ usage()
 Displays program usage information.
 """
 def usage(): # {{{2
-    # TODO: something something print stuff or w/e
+    arg_parser().print_help()
     return
 # }}}2
 
@@ -1322,7 +3554,7 @@ TODO:
 """
 def curses_init(): # {{{2
     # make sure we store to the global window instance
-    global window
+    global window, statusbar
     # initialize curses system
     try:
         window = curses.initscr()
@@ -1331,7 +3563,7 @@ def curses_init(): # {{{2
         sys.stderr.write("[curses.initscr(): " + str(e) + '\n')
         return False
     # double check our `window' object
-    if window is None or window is 0:
+    if window is None or window == 0:
         # initialization has failed!
         return False
 # FIXME: fix terminal restoration bug on exit
@@ -1346,6 +3578,9 @@ def curses_init(): # {{{2
     curses.noecho()
     # `rare' mode
     curses.cbreak()
+    # don't hang around long after a lone ESC
+    if hasattr(curses, 'set_escdelay'):
+        curses.set_escdelay(ESC_DELAY)
     # start color mode
     curses.start_color()
     # set up custom color pairs
@@ -1363,6 +3598,9 @@ def curses_init(): # {{{2
 
     # get the window size
     view['height'], view['width'] = window.getmaxyx()
+    # the bottom line is kept for the status bar
+    view['height'] -= 1
+    statusbar = curses.newwin(1, view['width'], view['height'], 0)
 
 # FIXME: this still bugs out for some reason...
     # set up the scrolling region
@@ -1394,7 +3632,9 @@ def curses_init(): # {{{2
     
     # set cursor type   -   `[]`
     curses.curs_set(2)
-    # cause non-blocking input buffer
+    # let curses decode arrows and Fn keys
+    window.keypad(True)
+    # only read when there's input (see `ui_main()'), so never block
     window.nodelay(True)
     # set the background character
     window.bkgdset(' ')
@@ -1466,6 +3706,10 @@ TODO:
     - err check shutdown
 """
 def curses_close(): # {{{2
+    global window, statusbar
+    # was curses ever started? (headless commands never start it)
+    if window is None:
+        return False
     # have we already shut down?
     if curses.isendwin() is True:
         # yep! alert the user that we have
@@ -1483,6 +3727,7 @@ def curses_close(): # {{{2
     curses.endwin()
     # signal no UI
     window = None
+    statusbar = None
     # A-OKAY HERE BOSS!
     return True
 # }}}2
@@ -1529,6 +3774,11 @@ Using characteristics of the field (struct[key]) in question,
 """
 # FIXME: IS THIS EVEN GONNA BE USED?
 def get_data_type(struct, key): # {{{2
+    # the save layout spells its types out
+    if struct is save:
+        if key == 'checksum':
+            key = 'checksum[0]'
+        return schema[key].type if key in schema else None
 # TODO: validate params and key-existence
     # the type of data referenced
     data_type = None
@@ -1585,77 +3835,1190 @@ def ascii_art(): # {{{2
 # }}}2
 # }}}1
 
-"""
-main()
+# [CLI] {{{1
 
-Program entry point.
-"""
-# [MAIN] {{{1
-# print program info
+# [PROGRAM] {{{2
 fancy_e     = special_char[0xEA]
 prog_name   = "POK" + fancy_e + "SAVE"
 version     = "0.7a"
 author      = "David `SuperSalsa' Keaton"
 info        = "Save file editor for POK" + fancy_e + "MON Gen II"
-usage       = "{0} <filename>.sav"
-# save data file name
+# default save data file name (interactive mode)
 fname       = "POKEGOLD.SAV"
+# }}}2
 
-# show off some super cool program info and stuff!
-print("{} [v{}]".format(prog_name, version, author))
+"""
+read_save(fname)
+    fname   := path to the save file
 
-# do we have no arguments?
-if len(sys.argv) is 1:
-    # TODO: print usage information for (lack of) args
-    #usage()
-    pass
+returns:    ALL of the binary data as a `bytes-like' structure
 
-# TODO: TURN THIS BACK ON!!!
-# print some cool ascii art!
-ascii_art()
+Loads a save file without parsing or displaying anything.
+Raises `OSError' (or friends) if the file can't be read.
+"""
+def read_save(fname): # {{{2
+    # open, slurp, close
+    with phase('read', fname), io.FileIO(fname) as fd:
+        data = fd.readall()
+        io_stats['read'] += len(data)
+        return data
+# }}}2
 
-# try to open the save file
-try:
-    fd = io.FileIO(fname)
-# yikes! the file access errors
-except FileNotFoundError:
-    shutdown(ERR_FILE, "file not found")
-# depending on python version, `OSError' is `IOError'
-except (OSError, IOError) as e:
-    #shutdown(ERR_FILE, "file can't be opened")
-    shutdown(ERR_FILE, e)
-
-# was file I/O successful?
-if fd is not None and fd is not 0:
-    # load ALL of the binary data into a `bytes-like' structure
-    data = fd.readall()
-else:
-    # zoinks! file couldn't be read!
-    shutdown(ERR_FILE, "file is empty or couldn't be read")
-
-# XXX: ------------------------------------------------------------
-# XXX: STREAMIFY() FUNCTION TO CREATE DATA STREAM BASED ON `save{}'
-# XXX:                          AND VICE VERSA!!
-# XXX: ------------------------------------------------------------
-
-
-# now that the file has been loaded, let's parse
-parse(data)
-
-# display the data to the user          XXX: <IN PROGRESS>
-delta = display(data)
-
-# prime stream for display and editing  XXX: <DEPRECATED>
-#delta = edit(data)
-
-# validate data & checksums so the game won't crap all over us
-validate(data)
-
-# write the changes back to the file    XXX: <INCOMPLETE>
-sync(data, fd)
-
-# exit with no error
-shutdown()
+"""
+field_str(key, val=None)
+    key     := key into `save'
+    val     := field contents (defaults to save[key]['val'])
+
+returns:    printable representation of the field
+
+Turns a parsed field into something a human can read.
+"""
+def field_str(key, val=None): # {{{2
+    # default to whatever `parse()' found
+    if val is None:
+        val = save[key]['val']
+    value = field_value(key, val)
+    # lists of things get strung together
+    if isinstance(value, list):
+        return ', '.join(str(v) for v in value)
+    return str(value)
+# }}}2
+
+"""
+cmd_*(args)
+    args    := `argparse.Namespace' from `arg_parser()'
+
+returns:    ERR_* code
+
+Handlers for each sub-command. Every headless command takes any
+    number of paths, reports per-file errors to stderr, and keeps going.
+"""
+def cmd_edit(args): # {{{2
+    # show off some super cool program info and stuff!
+    print("{} [v{}]".format(prog_name, version))
+    # print some cool ascii art!
+    ascii_art()
+
+    # display the data to the user, loading it (every edit is one
+    # transaction) in the background          XXX: <IN PROGRESS>
+    try:
+        txn = display(args.file)
+    # yikes! the file access errors
+    except FileNotFoundError:
+        shutdown(ERR_FILE, "file not found")
+    # depending on python version, `OSError' is `IOError'
+    except (OSError, IOError, ValueError) as e:
+        shutdown(ERR_FILE, e)
+    # quit before it was even loaded? nothing to write
+    if txn is None:
+        shutdown()
+    # validate data & checksums so the game won't crap all over us,
+    # and write the changes back to the file
+    try:
+        txn.rescan()
+        txn.commit()
+    except (OSError, IOError, ValueError) as e:
+        shutdown(ERR_FILE, e)
+    # exit with no error
+    shutdown()
+    return ERR_NONE
+# }}}2
+
+def cmd_inspect(args): # {{{2
+    code = ERR_NONE
+    # line the values up like the editor does
+    tabstop = schema.width
+    for path in profiled(args.files):
+        try:
+            sf = SaveFile(path)
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+            continue
+        with sf:
+            print("{}:".format(path))
+            for k in sf.keys():
+                print("  {:<{}} {}".format(k, tabstop, field_str(k, sf[k])))
+            for addr, stored, computed in checksum_status(sf.buf):
+                print("  {:<{}} 0x{:04x} @ 0x{:04x}{}".format(
+                    'checksum', tabstop, stored, addr,
+                    '' if stored == computed else " (BAD)"))
+    return code
+# }}}2
+
+def cmd_validate(args): # {{{2
+    # report each checksum, stored vs. computed
+    def report(path, status):
+        bad = 0
+        for addr, stored, computed in status:
+            if stored != computed:
+                bad += 1
+                if not args.quiet:
+                    print("{}: checksum @ 0x{:04x} is 0x{:04x}, "
+                          "expected 0x{:04x}".format(path, addr,
+                                                     stored, computed))
+        if bad == 0 and not args.quiet:
+            print("{}: OK".format(path))
+        return ERR_FAIL if bad else ERR_NONE
+
+    code = ERR_NONE
+    # without NumPy, go one file at a time
+    if np is None or args.batch <= 1:
+        for path in profiled(args.files):
+            try:
+                with SaveFile(path) as sf:
+                    status = checksum_status(sf.buf)
+            except (OSError, IOError, ValueError) as e:
+                sys.stderr.write("{}: {}\n".format(path, e))
+                code = ERR_FILE
+                continue
+            if report(path, status) and code == ERR_NONE:
+                code = ERR_FAIL
+        return code
+
+    # read blocks of saves straight into the rows of one array
+    width = checksum_span()
+    rows = np.empty((args.batch, width), dtype=np.uint8)
+    addrs = [cs['addr'] for cs in save['checksum']]
+    for first in range(0, len(args.files), args.batch):
+        # (path, row) or (path, error message), in the order given
+        block = list()
+        n = 0
+        for path in args.files[first:first + args.batch]:
+            try:
+                with phase('read', path), io.FileIO(path) as fd:
+                    size = fd.readinto(rows[n])
+                    io_stats['read'] += size
+            except (OSError, IOError) as e:
+                block.append((path, str(e)))
+                continue
+            if size < width:
+                block.append((path, "file is too short"))
+                continue
+            block.append((path, n))
+            n += 1
+        if n > 0:
+            # one go for the whole block, there's no per-file share of it
+            with phase('checksum'):
+                valid, expected, stored = checksum_batch(rows[:n])
+        for path, row in block:
+            if isinstance(row, str):
+                sys.stderr.write("{}: {}\n".format(path, row))
+                code = ERR_FILE
+                continue
+            status = zip(addrs, stored[row].tolist(), expected[row].tolist())
+            if report(path, status) and code == ERR_NONE:
+                code = ERR_FAIL
+    return code
+# }}}2
+
+def cmd_fix_checksums(args): # {{{2
+    code = ERR_NONE
+    for path in profiled(args.files):
+        try:
+            # patch the mapping in-place, only write when needed
+            with SaveFile(path, writable=not args.dry_run) as sf:
+                status = validate(sf.buf, verify=True)
+                # don't bother touching files that are already correct
+                if all(stored == computed for _, stored, computed in status):
+                    print("{}: OK".format(path))
+                    continue
+                if args.dry_run:
+                    print("{}: needs fixing".format(path))
+                    continue
+                validate(sf.buf, dirty=sf.dirty)
+                print("{}: fixed".format(path))
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+    return code
+# }}}2
+
+def cmd_dump(args): # {{{2
+    code = ERR_NONE
+    for path in profiled(args.files):
+        try:
+            sf = SaveFile(path)
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+            continue
+        with sf:
+            # one JSON object per file, raw fields as hex
+            out = {'file': path, 'fields': {}, 'checksum': []}
+            for k in sf.keys():
+                out['fields'][k] = {
+                        'addr': schema[k].addr,
+                        'size': schema[k].size,
+                        'hex':  sf[k].hex(),
+                }
+            for addr, stored, computed in checksum_status(sf.buf):
+                out['checksum'].append({'addr': addr,
+                                        'stored': stored,
+                                        'computed': computed})
+        print(json.dumps(out))
+    return code
+# }}}2
+
+def cmd_dex(args): # {{{2
+    key = 'pokedex_seen' if args.seen else 'pokedex_owned'
+    f = schema[key]
+    counts = [0] * POKEDEX_COUNT
+    n = 0
+    code = ERR_NONE
+    # without NumPy, go one file at a time
+    if np is None or args.batch <= 1:
+        for path in args.files:
+            try:
+                with io.FileIO(path) as fd:
+                    mem = fd.read(f.end)
+            except (OSError, IOError) as e:
+                sys.stderr.write("{}: {}\n".format(path, e))
+                code = ERR_FILE
+                continue
+            if len(mem) < f.end:
+                sys.stderr.write("{}: file is too short\n".format(path))
+                code = ERR_FILE
+                continue
+            for species in Pokedex.from_bytes(mem[f.addr:f.end]):
+                counts[species - 1] += 1
+            n += 1
+    else:
+        # read blocks of saves straight into the rows of one array
+        rows = np.empty((args.batch, f.end), dtype=np.uint8)
+        total = np.zeros(POKEDEX_COUNT, dtype=np.int64)
+        for first in range(0, len(args.files), args.batch):
+            m = 0
+            for path in args.files[first:first + args.batch]:
+                try:
+                    with phase('read', path), io.FileIO(path) as fd:
+                        size = fd.readinto(rows[m])
+                        io_stats['read'] += size
+                except (OSError, IOError) as e:
+                    sys.stderr.write("{}: {}\n".format(path, e))
+                    code = ERR_FILE
+                    continue
+                if size < f.end:
+                    sys.stderr.write("{}: file is too short\n".format(path))
+                    code = ERR_FILE
+                    continue
+                m += 1
+            if m > 0:
+                with phase('pokedex'):
+                    total += pokedex_batch(rows[:m], key)[0]
+                n += m
+        counts = total.tolist()
+    frequency = [c / n if n else 0.0 for c in counts]
+    if args.json:
+        print(json.dumps({'key': key, 'saves': n, 'counts': counts,
+                          'frequency': frequency}))
+    else:
+        for i, (c, x) in enumerate(zip(counts, frequency)):
+            print("{:3d}  {:6d}  {:.4f}".format(i + 1, c, x))
+    return code
+# }}}2
+
+def cmd_names(args): # {{{2
+    code = ERR_NONE
+    for path in profiled(args.files):
+        try:
+            sf = SaveFile(path)
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+            continue
+        with sf:
+            # one line per name: file, location, text
+            for (k, kind, i), raw, text in iter_names(sf.buf):
+                print("{}\t{}.{}[{}]\t{}".format(path, k, kind, i, text))
+    return code
+# }}}2
+
+def cmd_find(args): # {{{2
+    code = ERR_NONE
+    query = dict()
+    for a in SaveIndex.attrs:
+        if getattr(args, a) is not None:
+            query[a] = getattr(args, a)
+    for path in args.files:
+        try:
+            sf = SaveFile(path)
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+            continue
+        with sf:
+            index = SaveIndex(sf)
+            # list them in save order
+            order = list(index.lists.keys())
+            for k, slot in sorted(index.find(**query),
+                                  key=lambda l: (order.index(l[0]), l[1])):
+                v = index[(k, slot)]
+                print("{}\t{}[{}]\tspecies={} ot_id={} item={}\t{}".format(
+                      path, k, slot, v['species'], v['ot_id'], v['item'],
+                      v['nickname']))
+    return code
+# }}}2
+
+"""
+iter_save_paths(paths)
+    paths   := files and/or directories
+
+yields:     every file given, plus every `*.sav' file under each directory
+
+Walks lazily, so huge trees never sit in memory.
+"""
+def iter_save_paths(paths): # {{{2
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            # walk in a stable order
+            dirs.sort()
+            for f in sorted(files):
+                if f.lower().endswith('.sav'):
+                    yield os.path.join(root, f)
+    return
+# }}}2
+
+"""
+scan_worker()
+
+Runs first thing in each worker process of `scan()'. A forked worker
+    inherits the parent's hooks (and open profile output) along with
+    its stack of running phases; none of that is any good in here.
+"""
+def scan_worker(): # {{{2
+    hooks.clear()
+    running.__dict__.clear()
+# }}}2
+
+"""
+scan_chunk(paths, profile=False)
+    paths   := list of save file paths
+    profile := record the phases of each save
+
+returns:    (lines, records)
+                lines   := list of JSON lines, one per path
+                records := phase records (see `add_hook()'), if `profile'
+
+Runs inside a worker process: reads and summarizes each save.
+    Unreadable files get an `error' entry instead of a summary. The
+    records go back to the parent with the lines, to be handed to its
+    hooks there.
+"""
+def scan_chunk(paths, profile=False): # {{{2
+    lines = list()
+    records = list()
+    if profile:
+        add_hook(records.append)
+    try:
+        for path in profiled(paths):
+            try:
+                out = {'file': path}
+                out.update(summarize(read_save(path)))
+            except (OSError, IOError, ValueError, IndexError) as e:
+                out = {'file': path, 'error': str(e)}
+            lines.append(json.dumps(out))
+    finally:
+        if profile:
+            remove_hook(records.append)
+    return lines, records
+# }}}2
+
+"""
+scan(paths, workers=None, chunksize=64, ordered=True)
+    paths       := iterable of save file paths
+    workers     := worker processes (defaults to the number of CPUs)
+    chunksize   := paths handed to a worker at a time
+    ordered     := yield in the order of `paths' (else as they finish)
+
+yields:     JSON lines (see `summarize()'), one per path
+
+Spreads the saves across a process pool. Only a couple of chunks per
+    worker are ever in flight, so memory stays bounded no matter how
+    many paths there are. With hooks installed, each save's phases are
+    recorded in the worker and handed to the hooks here, nested under
+    whatever phase is running (i.e. 'scan').
+"""
+def scan(paths, workers=None, chunksize=64, ordered=True): # {{{2
+    workers = workers or os.cpu_count() or 1
+    paths = iter(paths)
+    def chunks():
+        while True:
+            chunk = list(itertools.islice(paths, chunksize))
+            if len(chunk) == 0:
+                return
+            yield chunk
+    todo = chunks()
+    profile = len(hooks) > 0
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=scan_worker) as pool:
+        # keep every worker busy, plus one chunk queued up for each
+        pending = collections.deque(pool.submit(scan_chunk, c, profile)
+                                    for c in itertools.islice(todo,
+                                                              workers * 2))
+        while pending:
+            if ordered:
+                done = pending.popleft()
+            else:
+                finished, _ = concurrent.futures.wait(
+                        pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                done = finished.pop()
+                pending.remove(done)
+            # top the pool back up before handing results out
+            for c in itertools.islice(todo, 1):
+                pending.append(pool.submit(scan_chunk, c, profile))
+            lines, records = done.result()
+            # the worker's phases sit under ours
+            depth = len(running.__dict__.get('phases', []))
+            for record in records:
+                record['depth'] += depth
+                for fn in list(hooks):
+                    fn(record)
+            for line in lines:
+                yield line
+    return
+# }}}2
+
+def cmd_scan(args): # {{{2
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for line in scan(iter_save_paths(args.paths), args.workers,
+                         args.chunksize, not args.unordered):
+            out.write(line + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return ERR_NONE
+# }}}2
+
+def cmd_diff(args): # {{{2
+    saves = list()
+    for path in (args.old, args.new):
+        try:
+            data = read_save(path)
+            # half a save can't be lined up against a whole one
+            if len(data) < checksum_span():
+                raise ValueError("file is too short")
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            return ERR_FILE
+        saves.append(data)
+    old, new = saves
+    changes = diff(old, new)
+    for c in changes:
+        if args.json:
+            print(json.dumps(c))
+            continue
+        where = c['region'] if c['part'] is None else \
+                "{}.{}".format(c['region'], c['part'])
+        print("{} @ 0x{:04x}: {} -> {}".format(where, c['addr'],
+                                              c['old'], c['new']))
+    # like diff(1): 1 means the saves differ
+    return ERR_FAIL if changes else ERR_NONE
+# }}}2
+
+def cmd_snapshot(args): # {{{2
+    code = ERR_NONE
+    store = SnapshotStore(args.store)
+    stamp = time.strftime('%Y%m%dT%H%M%S')
+    for path in args.files:
+        name = args.name or "{}-{}".format(
+                os.path.splitext(os.path.basename(path))[0], stamp)
+        try:
+            written = store.snapshot(read_save(path), name)
+        except (OSError, IOError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+            continue
+        print("{}: {} ({} new bytes)".format(path, name, written))
+    return code
+# }}}2
+
+def cmd_restore(args): # {{{2
+    store = SnapshotStore(args.store)
+    try:
+        # only the chunks that differ get read, and the save is swapped
+        # out all at once (never half old, half snapshot)
+        data = None
+        if os.path.exists(args.file):
+            data = bytearray(read_save(args.file))
+            # not even the same size? rebuild it from scratch
+            if len(data) != store.manifest(args.name)['size']:
+                data = None
+        fresh = data is None
+        patched = DirtyRanges()
+        data = store.restore(args.name, data, patched)
+        if patched or fresh:
+            atomic_write(args.file, data)
+    except (OSError, IOError, ValueError) as e:
+        sys.stderr.write("{}: {}\n".format(args.file, e))
+        return ERR_FILE
+    return ERR_NONE
+# }}}2
+
+def cmd_set(args): # {{{2
+    # key=value pairs, decoded per field
+    edits = list()
+    for pair in args.edits:
+        key, _, value = pair.partition('=')
+        if key not in schema or schema[key].type == TYPE_CHECKSUM:
+            sys.stderr.write("unknown field: {}\n".format(key))
+            return ERR_FAIL
+        edits.append((key, value))
+    code = ERR_NONE
+    for path in profiled(args.files):
+        try:
+            with Transaction(path) as txn:
+                for key, value in edits:
+                    set_field(txn, key, value)
+        except (OSError, IOError, ValueError) as e:
+            sys.stderr.write("{}: {}\n".format(path, e))
+            code = ERR_FILE
+    return code
+# }}}2
+
+"""
+make_fixture(rng)
+    rng     := `random.Random' to draw from
+
+returns:    a generated save (`bytearray', SAVE_SIZE bytes) with valid
+            checksums
+
+Starts from random bytes and lays sane values over the fields that get
+    decoded: names, money, time played, the pokedex, and a party and PC
+    boxes full of pokemon with matching species lists. The same seed
+    always gives the same save.
+"""
+def make_fixture(rng): # {{{2
+    buf = bytearray(rng.randbytes(SAVE_SIZE))
+    letters = [c for c in encode_table if c.isascii() and c.isalnum()]
+    def name(n=REAL_NAME_SIZE):
+        text = ''.join(rng.choice(letters)
+                       for _ in range(rng.randint(1, n)))
+        return (str_encode(text) + bytes((EON,))).ljust(n + 1, b'\x00')
+    def put(key, data):
+        buf[schema[key].addr:schema[key].addr + len(data)] = data
+    for key in ('player_name', 'rival_name'):
+        put(key, name().ljust(NAME_SIZE, bytes((EON,))))
+    put('pc_box_names', b''.join(name(BOX_NAME_SIZE - 1)
+                                 for _ in range(PC_BOX_COUNT)))
+    put('money', money_encode(rng.randrange(1000000)))
+    put('time_played', time_encode((rng.randrange(1000),
+                                    rng.randrange(60), rng.randrange(60))))
+    for key in ('pokedex_owned', 'pokedex_seen'):
+        put(key, Pokedex(rng.getrandbits(POKEDEX_COUNT)).to_bytes())
+    # count, species list (terminated), pokemon, OT names, nicknames
+    for key, capacity, cls in pokelists():
+        base = schema[key].addr
+        count = rng.randint(0, capacity)
+        species = [rng.randint(1, POKEDEX_COUNT) for _ in range(count)]
+        buf[base] = count
+        buf[base + 1:base + 2 + capacity] = \
+            bytes(species + [0xff] * (capacity + 1 - count))
+        first = base + 1 + capacity + 1
+        for i, n in enumerate(species):
+            mon = cls(buf, first + (i * cls.size))
+            mon.species = n
+            mon.level = rng.randint(1, 100)
+        names = first + (capacity * cls.size)
+        for i in range(0, 2 * capacity):
+            at = names + (i * NAME_SIZE)
+            buf[at:at + NAME_SIZE] = name().ljust(NAME_SIZE, b'\x00')
+    return validate(buf)
+# }}}2
+
+"""
+bench_run(fn, streams, n, repeat)
+    fn      := function to time, called with each save
+    streams := pool of saves, used round-robin
+    n       := calls per run
+    repeat  := runs
+
+returns:    list of seconds, one per run
+"""
+def bench_run(fn, streams, n, repeat): # {{{2
+    times = list()
+    for _ in range(0, repeat):
+        start = time.perf_counter()
+        for i in range(0, n):
+            fn(streams[i % len(streams)])
+        times.append(time.perf_counter() - start)
+    return times
+# }}}2
+
+"""
+benchmark(sizes, repeat=3, seed=0, pool=64)
+    sizes   := list of how many saves to run each benchmark over
+    repeat  := runs of each benchmark (the best one counts)
+    seed    := seed for `make_fixture()'
+    pool    := distinct saves to generate; they're reused round-robin,
+               so 100k saves don't need 100k saves worth of memory
+
+returns:    dict of the setup and a list of results, JSON-friendly
+
+Times the hot paths (`parse()', checksums, the string codec, pokemon
+    list decoding, `sync()') one save at a time, plus the NumPy batch
+    functions in blocks of 1024 saves (when NumPy is around). Each
+    result has the best and median time of its runs and the best time
+    per save, in seconds.
+"""
+def benchmark(sizes, repeat=3, seed=0, pool=64): # {{{2
+    rng = random.Random(seed)
+    streams = [make_fixture(rng) for _ in range(0, max(min(pool,
+                                                       max(sizes)), 1))]
+    names = [k for k in schema.names if schema[k].type == TYPE_NAME]
+    texts = [[str_decode(schema[k].view(s)) for k in names]
+             for s in streams]
+    party = schema['pokemon_party'].addr
+    boxes = [(schema[k].addr, capacity, cls)
+             for k, capacity, cls in pokelists() if cls is BoxPokemon]
+    span = checksum_span()
+    # where `sync()' writes to (the checksum words, like a fix would)
+    where = tempfile.mkdtemp(prefix="pokesave-bench.")
+    target = os.path.join(where, "bench.sav")
+    with open(target, 'wb') as f:
+        f.write(streams[0])
+    def sync_one(s):
+        dirty = DirtyRanges()
+        for cs in save['checksum']:
+            dirty.add(cs['addr'], cs['addr'] + CHECKSUM_SIZE)
+        sync(s, io.FileIO(target, 'r+'), dirty)
+    def checksum_one(s):
+        # just the chunks the checksums cover, like `validate()' sums
+        view = memoryview(s)
+        return [sum(checksum(view[c['start']:c['end']]) for c in cs['chunk'])
+                for cs in save['checksum']]
+    cases = [
+            ('parse',       parse),
+            ('checksum',    checksum_one),
+            ('validate',    validate),
+            ('str_decode',  lambda s: [str_decode(schema[k].view(s))
+                                       for k in names]),
+            ('str_encode',  lambda i: [str_encode(t) for t in texts[i]]),
+            ('party_decode', lambda s: [m.unpack() for m in
+                                        pokeparty_decode(s, party)]),
+            ('box_decode',  lambda s: [m.unpack() for a, c, cls in boxes
+                                       for m in pokelist_decode(s, c, cls,
+                                                                a)]),
+            ('sync',        sync_one),
+    ]
+    results = list()
+    def add(name, n, times):
+        times = sorted(times)
+        results.append({'name': name, 'saves': n, 'repeat': len(times),
+                        'best': times[0], 'median': times[len(times) // 2],
+                        'per_save': times[0] / n})
+    try:
+        for n in sizes:
+            for name, fn in cases:
+                # the encoder works from text, not saves
+                pool_ = range(len(streams)) if name == 'str_encode' \
+                        else streams
+                add(name, n, bench_run(fn, pool_, n, repeat))
+            if np is None:
+                continue
+            # blocks of up to 1024 saves, built from the pool
+            block = min(n, 1024)
+            rows = np.stack([np.frombuffer(streams[i % len(streams)],
+                                           dtype=np.uint8)
+                             for i in range(0, block)])
+            sizes_ = [block] * (n // block) + \
+                     ([n % block] if n % block else [])
+            add('checksum_batch', n, bench_run(
+                lambda m: checksum_batch(rows[:m, :span]), sizes_,
+                len(sizes_), repeat))
+            add('pokedex_batch', n, bench_run(
+                lambda m: pokedex_batch(rows[:m]), sizes_,
+                len(sizes_), repeat))
+            add('pc_boxes', n, bench_run(
+                lambda s: box_occupied(pc_boxes(s)).sum(), streams,
+                n, repeat))
+    finally:
+        os.unlink(target)
+        os.rmdir(where)
+    return {
+            'version':  version,
+            'python':   sys.version.split()[0],
+            'numpy':    np.__version__ if np is not None else None,
+            'platform': sys.platform,
+            'seed':     seed,
+            'pool':     len(streams),
+            'time':     time.time(),
+            'results':  results,
+    }
+# }}}2
+
+def cmd_bench(args): # {{{2
+    try:
+        sizes = [int(n) for n in args.sizes.split(',')]
+    except ValueError:
+        sys.stderr.write("bad --sizes: {}\n".format(args.sizes))
+        return ERR_FAIL
+    if not sizes or min(sizes) < 1 or args.repeat < 1:
+        sys.stderr.write("sizes and --repeat have to be at least 1\n")
+        return ERR_FAIL
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        json.dump(benchmark(sizes, args.repeat, args.seed, args.pool),
+                  out, indent=1)
+        out.write('\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return ERR_NONE
+# }}}2
+
+"""
+pokelist_json(stream, key, capacity, cls)
+    stream      := "bytes-like" data stream
+    key         := key into `save' of a pokemon list
+    capacity    := most pokemon the list can hold (PARTY_MAX, BOX_MAX)
+    cls         := `Pokemon' or `BoxPokemon'
+
+returns:    list of dicts, one per pokemon: every field of `cls', plus
+            its 'nickname' and 'ot_name'
+"""
+def pokelist_json(stream, key, capacity, cls): # {{{2
+    base = schema[key].addr
+    mem = memoryview(stream)[base:schema[key].end]
+    count, ots, nicks = pokelist_names(mem, capacity)
+    out = list()
+    for i, mon in enumerate(pokelist_decode(stream, capacity, cls, base)):
+        d = mon.unpack()
+        d['nickname'] = str_decode(mem[nicks + (i * NAME_SIZE):
+                                       nicks + ((i + 1) * NAME_SIZE)])
+        d['ot_name'] = str_decode(mem[ots + (i * NAME_SIZE):
+                                      ots + ((i + 1) * NAME_SIZE)])
+        out.append(d)
+    mem.release()
+    return out
+# }}}2
+
+"""
+queries
+
+What `serve()' answers, op => function of a save's bytes. Whatever they
+    return has to be JSON-friendly.
+"""
+queries = {
+        'names':        lambda data: [
+                {'field': k, 'kind': kind, 'index': i, 'text': text}
+                for (k, kind, i), raw, text in iter_names(data)],
+        'party':        lambda data: pokelist_json(
+                data, 'pokemon_party', PARTY_MAX, Pokemon),
+        'boxes':        lambda data: {
+                k: pokelist_json(data, k, capacity, cls)
+                for k, capacity, cls in pokelists() if cls is BoxPokemon},
+        'checksums':    lambda data: [
+                {'addr': addr, 'stored': stored, 'computed': computed}
+                for addr, stored, computed in checksum_status(data)],
+        'summary':      summarize,
+}
+
+"""
+SaveCache(size)
+    size    := most saves to keep
+
+Saves `serve()' has read, by path, least recently used thrown out
+    first. An entry is only good while the file's mtime and size are
+    what they were when it was read; each also keeps the (JSON) answer
+    to every query asked of it so far.
+"""
+class SaveCache: # {{{2
+    def __init__(self, size):
+        self.size       = size
+        self.entries    = collections.OrderedDict()
+        self.hits       = 0
+        self.misses     = 0
+
+    @staticmethod
+    def stamp(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def read(path):
+        # stat first: if it changes while we read, the next lookup misses
+        stamp = SaveCache.stamp(path)
+        data = read_save(path)
+        if len(data) < checksum_span():
+            raise ValueError("file is too short")
+        return stamp, data
+
+    def lookup(self, path):
+        entry = self.entries.get(path)
+        if entry is None or entry['stamp'] != self.stamp(path):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(path)
+        return entry
+
+    def store(self, path, stamp, data):
+        entry = {'stamp': stamp, 'data': data, 'answers': dict()}
+        self.entries[path] = entry
+        self.entries.move_to_end(path)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return entry
+
+    def drop(self, path):
+        self.entries.pop(path, None)
+# }}}2
+
+"""
+apply_edits(path, edits)
+    path    := save file
+    edits   := dict of key => value (see `set_field()')
+
+returns:    True if the file changed
+
+All of `edits' go in one `Transaction', or none of them do.
+"""
+def apply_edits(path, edits): # {{{2
+    with Transaction(path) as txn:
+        for key, value in edits.items():
+            if key not in schema or schema[key].type == TYPE_CHECKSUM:
+                raise ValueError("unknown field: {}".format(key))
+            set_field(txn, key, str(value))
+        return txn.commit()
+# }}}2
+
+"""
+serve(path, size=256)
+    path    := Unix socket to listen on
+    size    := most saves to keep parsed (see `SaveCache')
+
+Answers JSON requests, one per line, on a Unix socket until killed:
+
+        {"op": "party", "file": "/saves/GOLD.SAV"}
+        {"op": "set", "file": "/saves/GOLD.SAV", "edits": {"money": 5}}
+        {"op": "stats"}
+
+Each gets one line back, {"ok": true, "result": ...} or {"ok": false,
+    "error": "..."}. `queries' lists the ops that read; they're answered
+    from the cache while the file is unchanged, so repeats are just a
+    stat() and a lookup. Files are read (and written) in worker threads,
+    so slow disks don't hold up other clients. 'set' edits go through
+    `apply_edits()', one at a time per file.
+"""
+async def serve(path, size=256): # {{{2
+    loop = asyncio.get_running_loop()
+    cache = SaveCache(size)
+    locks = collections.defaultdict(asyncio.Lock)
+
+    async def answer(req):
+        op = req.get('op')
+        if op == 'stats':
+            return json.dumps({'entries': len(cache.entries),
+                               'size': cache.size, 'hits': cache.hits,
+                               'misses': cache.misses})
+        if 'file' not in req:
+            raise ValueError("no 'file' given")
+        fname = os.path.realpath(req['file'])
+        if op == 'set':
+            async with locks[fname]:
+                changed = await loop.run_in_executor(
+                        None, apply_edits, fname, dict(req.get('edits', {})))
+                cache.drop(fname)
+            return json.dumps(changed)
+        if op not in queries:
+            raise ValueError("unknown op: {}".format(op))
+        entry = cache.lookup(fname)
+        if entry is None:
+            stamp, data = await loop.run_in_executor(
+                    None, SaveCache.read, fname)
+            entry = cache.store(fname, stamp, data)
+        answers = entry['answers']
+        if op not in answers:
+            answers[op] = json.dumps(queries[op](entry['data']))
+        return answers[op]
+
+    async def client(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    req = json.loads(line)
+                    if not isinstance(req, dict):
+                        raise ValueError("requests are JSON objects")
+                    out = '{"ok": true, "result": ' + await answer(req) + '}'
+                # whatever goes wrong, it's only this request that failed
+                except Exception as e:
+                    out = json.dumps({'ok': False, 'error': str(e) or
+                                      type(e).__name__})
+                writer.write(out.encode() + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # clean up after a daemon that didn't
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(client, path)
+    os.chmod(path, 0o600)
+    # a polite kill stops it like ^C does
+    loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+# }}}2
+
+def cmd_serve(args): # {{{2
+    try:
+        asyncio.run(serve(args.socket, args.cache))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    except (OSError, IOError) as e:
+        sys.stderr.write("{}: {}\n".format(args.socket, e))
+        return ERR_FILE
+    return ERR_NONE
+# }}}2
+
+def cmd_query(args): # {{{2
+    req = {'op': args.op}
+    if args.file is not None:
+        req['file'] = os.path.abspath(args.file)
+    if args.edits:
+        req['edits'] = dict(pair.partition('=')[::2] for pair in args.edits)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(args.socket)
+            sock.sendall(json.dumps(req).encode() + b'\n')
+            reply = sock.makefile('rb').readline()
+    except (OSError, IOError) as e:
+        sys.stderr.write("{}: {}\n".format(args.socket, e))
+        return ERR_FILE
+    # no answer at all? the server hung up on us
+    try:
+        ok = json.loads(reply).get('ok')
+    except ValueError:
+        sys.stderr.write("{}: no reply\n".format(args.socket))
+        return ERR_FAIL
+    print(reply.decode().rstrip('\n'))
+    return ERR_NONE if ok else ERR_FAIL
+# }}}2
+
+# sub-command => handler
+commands = {
+        'edit':             cmd_edit,
+        'inspect':          cmd_inspect,
+        'validate':         cmd_validate,
+        'fix-checksums':    cmd_fix_checksums,
+        'dump':             cmd_dump,
+        'dex':              cmd_dex,
+        'names':            cmd_names,
+        'find':             cmd_find,
+        'scan':             cmd_scan,
+        'diff':             cmd_diff,
+        'snapshot':         cmd_snapshot,
+        'restore':          cmd_restore,
+        'set':              cmd_set,
+        'bench':            cmd_bench,
+        'serve':            cmd_serve,
+        'query':            cmd_query,
+}
+
+"""
+arg_parser()
+
+returns:    `argparse.ArgumentParser' for all of the sub-commands
+"""
+def arg_parser(): # {{{2
+    parser = argparse.ArgumentParser(prog="pokesave.py", description=info)
+    parser.add_argument('--version', action='version',
+                        version="{} [v{}]".format(prog_name, version))
+    parser.add_argument('--profile', metavar='FILE',
+                        help="write time and I/O per phase and per file "
+                             "as JSON lines ('-' for stderr)")
+    parser.add_argument('--profile-memory', action='store_true',
+                        help="trace allocations, for each phase's peak "
+                             "(slow)")
+    parser.add_argument('--profile-cpu', metavar='FILE',
+                        help="save cProfile stats of the whole run "
+                             "(see `pstats')")
+    sub = parser.add_subparsers(dest='command', metavar='command')
+    sub.required = True
+    # interactive editor
+    p = sub.add_parser('edit', help="edit a save file (CURSES UI)")
+    p.add_argument('file', nargs='?', default=fname)
+    p.set_defaults(func=cmd_edit)
+    # headless commands
+    p = sub.add_parser('inspect', help="print every field of each save")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_inspect)
+    p = sub.add_parser('validate', help="check the stored checksums")
+    p.add_argument('-q', '--quiet', action='store_true',
+                   help="only set the exit code")
+    p.add_argument('-b', '--batch', type=int, default=1024,
+                   help="saves checked per NumPy batch (default: 1024)")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_validate)
+    p = sub.add_parser('fix-checksums', help="recompute and store checksums")
+    p.add_argument('-n', '--dry-run', action='store_true',
+                   help="report what would be fixed, write nothing")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_fix_checksums)
+    p = sub.add_parser('dump', help="dump every field as JSON lines")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_dump)
+    p = sub.add_parser('dex', help="how often each species is in the "
+                                   "pokedex, across saves")
+    p.add_argument('-s', '--seen', action='store_true',
+                   help="count seen instead of owned")
+    p.add_argument('-b', '--batch', type=int, default=1024,
+                   help="saves counted per NumPy batch (default: 1024)")
+    p.add_argument('--json', action='store_true',
+                   help="one JSON object with every species")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_dex)
+    p = sub.add_parser('names', help="list every name stored in each save")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_names)
+    p = sub.add_parser('find', help="find pokemon in the party and PC")
+    p.add_argument('--species', type=lambda x: int(x, 0))
+    p.add_argument('--ot-id', dest='ot_id', type=lambda x: int(x, 0))
+    p.add_argument('--nickname')
+    p.add_argument('--item', type=lambda x: int(x, 0))
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_find)
+    p = sub.add_parser('scan', help="summarize saves as JSON lines, "
+                                    "in parallel")
+    p.add_argument('-j', '--workers', type=int, default=None,
+                   help="worker processes (default: one per CPU)")
+    p.add_argument('-c', '--chunksize', type=int, default=64,
+                   help="saves per work unit (default: 64)")
+    p.add_argument('-u', '--unordered', action='store_true',
+                   help="emit results as they finish")
+    p.add_argument('-o', '--output', help="write to a file, not stdout")
+    p.add_argument('paths', nargs='+', metavar='path',
+                   help="save files, or directories to search for *.sav")
+    p.set_defaults(func=cmd_scan)
+    p = sub.add_parser('diff', help="show what changed between two saves")
+    p.add_argument('--json', action='store_true',
+                   help="one JSON object per change")
+    p.add_argument('old')
+    p.add_argument('new')
+    p.set_defaults(func=cmd_diff)
+    p = sub.add_parser('snapshot', help="archive saves in a snapshot store")
+    p.add_argument('-n', '--name', help="snapshot name "
+                   "(default: <file>-<timestamp>)")
+    p.add_argument('store')
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_snapshot)
+    p = sub.add_parser('restore', help="rebuild a save from a snapshot")
+    p.add_argument('store')
+    p.add_argument('name')
+    p.add_argument('file')
+    p.set_defaults(func=cmd_restore)
+    p = sub.add_parser('set', help="edit fields, one transaction per save")
+    p.add_argument('-e', '--edit', dest='edits', action='append',
+                   required=True, metavar='key=value',
+                   help="names as text, money as a number, pokedex as "
+                        "species numbers, else hex")
+    p.add_argument('files', nargs='+', metavar='file')
+    p.set_defaults(func=cmd_set)
+    p = sub.add_parser('bench', help="time the hot paths on generated "
+                                     "saves, as JSON")
+    p.add_argument('-n', '--sizes', default='1,1000,10000,100000',
+                   help="saves per run, comma separated "
+                        "(default: 1,1000,10000,100000)")
+    p.add_argument('-r', '--repeat', type=int, default=3,
+                   help="runs of each benchmark, best is kept (default: 3)")
+    p.add_argument('-s', '--seed', type=int, default=0,
+                   help="seed for the generated saves (default: 0)")
+    p.add_argument('-p', '--pool', type=int, default=64,
+                   help="distinct saves generated, reused round-robin "
+                        "(default: 64)")
+    p.add_argument('-o', '--output', help="write to a file, not stdout")
+    p.set_defaults(func=cmd_bench)
+    p = sub.add_parser('serve', help="answer JSON queries on a Unix socket, "
+                                     "keeping saves parsed")
+    p.add_argument('-c', '--cache', type=int, default=256,
+                   help="most saves kept parsed (default: 256)")
+    p.add_argument('socket')
+    p.set_defaults(func=cmd_serve)
+    p = sub.add_parser('query', help="ask a running 'serve' something")
+    p.add_argument('-e', '--edit', dest='edits', action='append',
+                   metavar='key=value', help="edits, for the 'set' op")
+    p.add_argument('socket')
+    p.add_argument('op', choices=sorted(queries) + ['set', 'stats'])
+    p.add_argument('file', nargs='?')
+    p.set_defaults(func=cmd_query)
+    return parser
+# }}}2
+# }}}1
+
+"""
+main(argv=None)
+    argv    := list of command-line arguments (defaults to `sys.argv[1:]')
+
+returns:    ERR_* code to hand back to the calling environment
+
+Program entry point.
+
+With no sub-command (i.e. `pokesave.py <filename>.sav') the interactive
+    CURSES editor is started, just like always. Any of the headless
+    sub-commands in `commands' never touch CURSES or the ASCII art.
+"""
+# [MAIN] {{{1
+def main(argv=None): # {{{2
+    # default to what the shell handed us
+    if argv is None:
+        argv = sys.argv[1:]
+    # do we have no arguments?
+    if len(argv) == 0:
+        usage()
+        return ERR_FAIL
+    # old-school invocation: `pokesave.py <filename>.sav'
+    if argv[0] not in commands and not argv[0].startswith('-'):
+        argv = ['edit'] + list(argv)
+    # let argparse sort out the rest
+    args = arg_parser().parse_args(argv)
+    # no profiling? straight to it
+    if not (args.profile or args.profile_memory or args.profile_cpu):
+        return args.func(args)
+    out = None
+    if args.profile == '-':
+        out = sys.stderr
+    elif args.profile:
+        out = open(args.profile, 'a')
+    def emit(record):
+        out.write(json.dumps(record) + '\n')
+    if out is not None:
+        add_hook(emit)
+    if args.profile_memory:
+        tracemalloc.start()
+    prof = cProfile.Profile() if args.profile_cpu else None
+    try:
+        if prof is not None:
+            prof.enable()
+        with phase(args.command):
+            return args.func(args)
+    finally:
+        if prof is not None:
+            prof.disable()
+            prof.dump_stats(args.profile_cpu)
+        if args.profile_memory:
+            tracemalloc.stop()
+        if out is not None:
+            remove_hook(emit)
+            if out is not sys.stderr:
+                out.close()
+# }}}2
+
+if __name__ == '__main__':
+    sys.exit(main())
 
 # }}}1
 
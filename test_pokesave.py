@@ -0,0 +1,560 @@
+import os
+
+import pytest
+
+import pokesave
+from pokesave import str_encode, str_decode, decode_table, EON, UNKNOWN_CHAR
+
+
+# real names, including ones that start out like the PO/PK/MN tiles
+@pytest.mark.parametrize('name', [
+        "POLIWAG", "PONYTA", "SPOT", "POLLY", "PIKACHU", "MR.MIME",
+        "PKMN", "Ké", "HacKeR", "DUMBASS", "FARFETCH'D", "NIDORAN♂",
+        "BOX1", "POKéMON",
+])
+def test_name_round_trip(name):
+    assert str_decode(str_encode(name)) == name
+
+
+def test_letters_are_spelled_out():
+    # P, O, L, I, W, A, G: no 0x70 'PO' tile
+    assert str_encode("POLIWAG") == bytes((0x8F, 0x8E, 0x8B, 0x88, 0x96,
+                                           0x80, 0x86))
+    assert str_encode("PKMN") == bytes((0x8F, 0x8A, 0x8C, 0x8D))
+
+
+def test_ligatures_without_a_spelling():
+    assert str_encode("'s") == bytes((0xD4,))
+    assert str_encode("'d") == bytes((0xD0,))
+
+
+def test_decode_stops_at_terminator():
+    assert str_decode(str_encode("GOLD") + bytes((EON, 0x80))) == "GOLD"
+
+
+# every byte with a glyph: decode -> encode -> decode gives the glyph back
+@pytest.mark.parametrize('c', [c for c in range(0, 256)
+                               if c not in (0x00, EON) and
+                               decode_table[c] != UNKNOWN_CHAR])
+def test_glyph_round_trip(c):
+    glyph = str_decode(bytes((c,)))
+    assert str_decode(str_encode(glyph)) == glyph
+
+
+# and every glyph the encoder knows comes back out as itself
+@pytest.mark.parametrize('text', sorted(pokesave.encode_table.keys()))
+def test_encode_table_round_trip(text):
+    assert str_decode(str_encode(text)) == text
+
+
+@pytest.mark.parametrize('text', ["~", "_", "GOLD_"])
+def test_unknown_text(text):
+    with pytest.raises(ValueError):
+        str_encode(text)
+
+
+@pytest.mark.parametrize('size', [100, 0x2900])
+def test_short_save(tmp_path, size):
+    path = tmp_path / "short.sav"
+    path.write_bytes(bytes(size))
+    with pytest.raises(ValueError):
+        pokesave.SaveFile(str(path))
+
+
+@pytest.fixture
+def txn(tmp_path):
+    path = tmp_path / "edit.sav"
+    path.write_bytes(bytes(pokesave.SAVE_SIZE))
+    return pokesave.Transaction(str(path))
+
+
+@pytest.mark.parametrize('key,value', [
+        ('money', "99999999"), ('money', "1000000"), ('money', "-1"),
+        ('dst', "300"), ('trainer_id', "70000"), ('trainer_id', "-1"),
+        ('time_played', "1,99,99"), ('time_played', "1,60,0"),
+        ('time_played', "1,0,60"), ('time_played', "70000,0,0"),
+        ('time_played', "-1,0,0"), ('time_played', "1,2"),
+])
+def test_set_field_out_of_range(txn, key, value):
+    with pytest.raises(ValueError):
+        pokesave.set_field(txn, key, value)
+    assert not txn.dirty
+
+
+@pytest.mark.parametrize('key,value,data', [
+        ('money', "999999", bytes((0x0F, 0x42, 0x3F))),
+        ('trainer_id', "65535", bytes((0xFF, 0xFF))),
+        ('time_played', "300,59,59", bytes((0x01, 0x2C, 59, 59))),
+])
+def test_set_field_in_range(txn, key, value, data):
+    pokesave.set_field(txn, key, value)
+    f = pokesave.schema[key]
+    assert bytes(txn.data[f.addr:f.end]) == data
+
+
+def test_commit_fixes_checksums(txn):
+    pokesave.set_field(txn, 'money', "3000")
+    pokesave.set_field(txn, 'player_name', "GOLD")
+    assert txn.commit()
+    with open(txn.fname, 'rb') as f:
+        data = f.read()
+    assert all(stored == computed for _, stored, computed
+               in pokesave.checksum_status(data))
+    assert pokesave.money_decode(data[pokesave.schema['money'].addr:]) == 3000
+
+
+def test_commit_writes_only_dirty_ranges(txn, tmp_path):
+    before = (tmp_path / "edit.sav").read_bytes()
+    pokesave.set_field(txn, 'money', "3000")
+    txn.commit()
+    after = (tmp_path / "edit.sav").read_bytes()
+    changed = [i for i in range(len(before)) if before[i] != after[i]]
+    f = pokesave.schema['money']
+    cs = [c['addr'] for c in pokesave.save['checksum']]
+    assert all(f.addr <= i < f.end or
+               any(a <= i < a + pokesave.CHECKSUM_SIZE for a in cs)
+               for i in changed)
+    assert not (tmp_path / ("edit.sav" + pokesave.JOURNAL_EXT)).exists()
+
+
+def test_journal_replay(tmp_path):
+    path = str(tmp_path / "edit.sav")
+    old = bytes(pokesave.SAVE_SIZE)
+    new = bytearray(old)
+    new[0x2000:0x2004] = b'GOLD'
+    # crash right after the journal was written
+    with open(path, 'wb') as f:
+        f.write(old)
+    body = bytearray(pokesave.JOURNAL_MAGIC)
+    body += pokesave.JOURNAL_RANGE.pack(0x2000, 4) + b'GOLD'
+    body += pokesave.hashlib.sha1(body).digest()
+    with open(path + pokesave.JOURNAL_EXT, 'wb') as f:
+        f.write(body)
+    txn = pokesave.Transaction(path)
+    assert bytes(txn.data) == bytes(new)
+    assert not (tmp_path / ("edit.sav" + pokesave.JOURNAL_EXT)).exists()
+
+
+def test_torn_journal_is_dropped(tmp_path):
+    path = str(tmp_path / "edit.sav")
+    with open(path, 'wb') as f:
+        f.write(bytes(pokesave.SAVE_SIZE))
+    body = bytearray(pokesave.JOURNAL_MAGIC)
+    body += pokesave.JOURNAL_RANGE.pack(0x2000, 4) + b'GO'
+    with open(path + pokesave.JOURNAL_EXT, 'wb') as f:
+        f.write(body)
+    assert not pokesave.journal_replay(path)
+    with open(path, 'rb') as f:
+        assert f.read() == bytes(pokesave.SAVE_SIZE)
+
+
+@pytest.fixture
+def sf(tmp_path):
+    path = tmp_path / "map.sav"
+    path.write_bytes(bytes(pokesave.SAVE_SIZE))
+    with pokesave.SaveFile(str(path), writable=True) as sf:
+        yield sf
+
+
+def test_mark_dirty_resums(sf):
+    sf['money'] = bytes((0, 0, 1))
+    addr = pokesave.schema['player_name'].addr
+    sf.buf[addr] = 0x80
+    sf.mark_dirty(addr, addr + 1)
+    assert any(start <= addr < end for start, end in sf.dirty)
+    sf.store_checksums()
+    assert all(stored == computed for _, stored, computed
+               in pokesave.checksum_status(sf.buf))
+
+
+def test_flush_after_handing_out_slices(sf):
+    assert not sf.untracked
+    sf['money'][2] = 7
+    assert sf.untracked
+    sf.flush()
+    assert not sf.dirty
+    with open(sf.fname, 'rb') as f:
+        f.seek(pokesave.schema['money'].addr + 2)
+        assert f.read(1) == bytes((7,))
+
+
+def test_snapshot_chunks_cover_the_save():
+    chunks = pokesave.snapshot_chunks(pokesave.SAVE_SIZE)
+    assert chunks[0][1] == 0 and chunks[-1][2] == pokesave.SAVE_SIZE
+    assert all(a[2] == b[1] for a, b in zip(chunks, chunks[1:]))
+    assert all(end - start >= pokesave.SNAPSHOT_CHUNK
+               for _, start, end in chunks[:-1])
+
+
+def test_snapshot_restore(tmp_path):
+    rng = pokesave.random.Random(1)
+    old = pokesave.make_fixture(rng)
+    new = bytearray(old)
+    new[pokesave.schema['money'].addr] ^= 0xFF
+    store = pokesave.SnapshotStore(str(tmp_path / "store"))
+    assert store.snapshot(old, 'old') == len(old)
+    # one changed chunk, not a whole new copy
+    assert 0 < store.snapshot(new, 'new') < len(old) // 4
+    assert sorted(os.listdir(str(tmp_path / "store"))) == [
+            'pack', 'pack.idx', 'snapshots']
+    # a fresh store reads the index back
+    store = pokesave.SnapshotStore(str(tmp_path / "store"))
+    patched = pokesave.DirtyRanges()
+    assert store.restore('old', bytearray(new), patched) == old
+    assert len(patched) == 1
+    assert store.restore('new') == new
+
+
+def test_torn_index_line_is_ignored(tmp_path):
+    store = pokesave.SnapshotStore(str(tmp_path))
+    store.snapshot(bytes(pokesave.SAVE_SIZE), 'zero')
+    with open(store.index_path, 'a') as f:
+        f.write("0123abcd 999999")
+    store = pokesave.SnapshotStore(str(tmp_path))
+    assert store.restore('zero') == bytes(pokesave.SAVE_SIZE)
+    # the next snapshot's index lines don't get glued onto it
+    new = pokesave.make_fixture(pokesave.random.Random(3))
+    store.snapshot(new, 'new')
+    store = pokesave.SnapshotStore(str(tmp_path))
+    assert store.restore('new') == new
+    assert store.restore('zero') == bytes(pokesave.SAVE_SIZE)
+
+
+def test_restore_swaps_the_file(tmp_path):
+    path = tmp_path / "a.sav"
+    path.write_bytes(bytes(pokesave.SAVE_SIZE))
+    store = str(tmp_path / "store")
+    assert pokesave.main(['snapshot', '-n', 'zero', store, str(path)]) == 0
+    path.write_bytes(b'\x01' * pokesave.SAVE_SIZE)
+    inode = os.stat(str(path)).st_ino
+    assert pokesave.main(['restore', store, 'zero', str(path)]) == 0
+    assert path.read_bytes() == bytes(pokesave.SAVE_SIZE)
+    assert os.stat(str(path)).st_ino != inode
+
+
+def test_diff_short_save(tmp_path):
+    whole = bytes(pokesave.SAVE_SIZE)
+    with pytest.raises(ValueError):
+        pokesave.diff(whole, whole[:0x2900])
+    path = tmp_path / "short.sav"
+    path.write_bytes(whole[:0x2900])
+    assert pokesave.main(['diff', str(path), str(path)]) == pokesave.ERR_FILE
+
+
+def test_commit_refuses_a_changed_file(tmp_path):
+    path = tmp_path / "edit.sav"
+    rng = pokesave.random.Random(2)
+    path.write_bytes(pokesave.make_fixture(rng))
+    txn = pokesave.Transaction(str(path))
+    # somebody else saves in the meantime
+    theirs = pokesave.make_fixture(rng)
+    path.write_bytes(theirs)
+    pokesave.set_field(txn, 'player_name', "GOLD")
+    with pytest.raises(ValueError):
+        txn.commit()
+    assert path.read_bytes() == theirs
+
+
+def pokelist_entries(data, key):
+    # (species, record, OT name, nickname) of every pokemon in a list
+    cap, cls = {k: (c, cls) for k, c, cls in pokesave.pokelists()}[key]
+    f = pokesave.schema[key]
+    count, ots, nicks = pokesave.pokelist_names(f.view(data), cap)
+    mons = f.addr + 1 + cap + 1
+    name = pokesave.NAME_SIZE
+    return [(data[f.addr + 1 + i],
+             bytes(data[mons + (i * cls.size):mons + ((i + 1) * cls.size)]),
+             bytes(data[f.addr + ots + (i * name):
+                        f.addr + ots + ((i + 1) * name)]),
+             bytes(data[f.addr + nicks + (i * name):
+                        f.addr + nicks + ((i + 1) * name)]))
+            for i in range(0, count)]
+
+
+def pokelist_store(data, key, entries):
+    # write a list back packed, the way the game keeps it
+    cap, cls = {k: (c, cls) for k, c, cls in pokesave.pokelists()}[key]
+    f = pokesave.schema[key]
+    _, ots, nicks = pokesave.pokelist_names(f.view(data), cap)
+    data[f.addr:f.end] = bytes(f.size)
+    data[f.addr] = len(entries)
+    data[f.addr + 1 + len(entries)] = 0xFF
+    mons = f.addr + 1 + cap + 1
+    name = pokesave.NAME_SIZE
+    for i, (species, mon, ot, nick) in enumerate(entries):
+        data[f.addr + 1 + i] = species
+        data[mons + (i * cls.size):mons + ((i + 1) * cls.size)] = mon
+        data[f.addr + ots + (i * name):f.addr + ots + ((i + 1) * name)] = ot
+        data[f.addr + nicks + (i * name):
+             f.addr + nicks + ((i + 1) * name)] = nick
+
+
+def test_save_index_follows_edits():
+    with open("POKEGOLD.SAV", 'rb') as f:
+        data = bytearray(f.read())
+    idx = pokesave.SaveIndex(data)
+    # edit: new held item in box 1, slot 0
+    box1 = pokelist_entries(data, 'pokemon_box_1')
+    assert len(box1) == 4
+    mon = bytearray(box1[0][1])
+    mon[1] = 0x12
+    box1[0] = box1[0][:1] + (bytes(mon),) + box1[0][2:]
+    pokelist_store(data, 'pokemon_box_1', box1)
+    idx.update('pokemon_box_1', 0)
+    assert idx.slots == pokesave.SaveIndex(data).slots
+    # move: box 1 slot 1 to the front of box 2 (box 1 packs up)
+    box2 = pokelist_entries(data, 'pokemon_box_2')
+    box2.insert(0, box1.pop(1))
+    pokelist_store(data, 'pokemon_box_1', box1)
+    pokelist_store(data, 'pokemon_box_2', box2)
+    idx.move(('pokemon_box_1', 1), ('pokemon_box_2', 0))
+    assert ('pokemon_box_1', 3) not in idx.slots
+    assert idx.slots == pokesave.SaveIndex(data).slots
+    # and within one list: last of the party to the front
+    party = pokelist_entries(data, 'pokemon_party')
+    party.insert(0, party.pop())
+    pokelist_store(data, 'pokemon_party', party)
+    idx.move(('pokemon_party', len(party) - 1), ('pokemon_party', 0))
+    assert idx.slots == pokesave.SaveIndex(data).slots
+    # release: box 1 slot 0 goes away
+    box1.pop(0)
+    pokelist_store(data, 'pokemon_box_1', box1)
+    idx.release('pokemon_box_1', 0)
+    assert idx.slots == pokesave.SaveIndex(data).slots
+    assert idx.by == pokesave.SaveIndex(data).by
+
+
+@pytest.fixture
+def records():
+    out = list()
+    pokesave.add_hook(out.append)
+    yield out
+    pokesave.remove_hook(out.append)
+
+
+def test_phase_without_hooks():
+    assert not pokesave.hooks
+    with pokesave.phase('read', "x.sav"):
+        pass
+    assert not getattr(pokesave.running, 'phases', [])
+
+
+def test_phase_records(records):
+    with pokesave.phase('file', "x.sav"):
+        with pokesave.phase('read'):
+            pokesave.io_stats['read'] += 10
+        with pytest.raises(ValueError):
+            with pokesave.phase('parse'):
+                raise ValueError
+    assert [(r['phase'], r['file'], r['depth']) for r in records] == [
+            ('read', "x.sav", 1), ('parse', "x.sav", 1), ('file', "x.sav", 0)]
+    assert records[0]['read'] == 10 and records[2]['read'] == 10
+    assert records[1]['error'] == 'ValueError'
+    assert 'error' not in records[2]
+
+
+def test_scan_reports_worker_phases(tmp_path, records):
+    paths = list()
+    for i in range(0, 3):
+        path = tmp_path / "{}.sav".format(i)
+        path.write_bytes(pokesave.make_fixture(pokesave.random.Random(i)))
+        paths.append(str(path))
+    with pokesave.phase('scan'):
+        lines = list(pokesave.scan(paths, workers=2, chunksize=1))
+    assert len(lines) == 3
+    files = [r for r in records if r['phase'] == 'file']
+    assert sorted(r['file'] for r in files) == paths
+    assert all(r['depth'] == 1 for r in files)
+    reads = [r for r in records if r['phase'] == 'read']
+    assert all(r['depth'] == 2 and r['read'] == pokesave.SAVE_SIZE
+               for r in reads) and len(reads) == 3
+
+
+@pytest.mark.skipif(pokesave.np is None, reason="needs NumPy")
+def test_batch_validate_reports_each_file(tmp_path, records):
+    paths = list()
+    for i in range(0, 3):
+        path = tmp_path / "{}.sav".format(i)
+        path.write_bytes(pokesave.make_fixture(pokesave.random.Random(i)))
+        paths.append(str(path))
+    assert pokesave.main(['validate', '-q'] + paths) == pokesave.ERR_NONE
+    assert [r['file'] for r in records if r['phase'] == 'read'] == paths
+
+
+def batch_saves(n):
+    rng = pokesave.random.Random(4)
+    saves = [bytearray(pokesave.make_fixture(rng)) for _ in range(0, n)]
+    # break a checksum or two
+    saves[1][pokesave.save['checksum'][0]['addr']] ^= 0xFF
+    saves[2][pokesave.save['checksum'][1]['chunk'][1]['start']] ^= 0x01
+    return saves
+
+
+def check_batch(saves):
+    valid, expected, stored = pokesave.checksum_batch(
+            pokesave.np.stack([pokesave.np.frombuffer(bytes(s),
+                                                      dtype=pokesave.np.uint8)
+                               for s in saves]))
+    for i, s in enumerate(saves):
+        status = pokesave.checksum_status(s)
+        assert stored[i].tolist() == [st for _, st, _ in status]
+        assert expected[i].tolist() == [x for _, _, x in status]
+        assert bool(valid[i]) == all(st == x for _, st, x in status)
+    return valid
+
+
+@pytest.mark.skipif(pokesave.np is None, reason="needs NumPy")
+def test_checksum_batch():
+    valid = check_batch(batch_saves(5))
+    assert valid.tolist() == [True, False, False, True, True]
+
+
+@pytest.mark.skipif(pokesave.np is None, reason="needs NumPy")
+def test_checksum_batch_touching_chunks(monkeypatch):
+    # split a chunk in two: same sums, but `reduceat()' can't do it
+    cs = [dict(c) for c in pokesave.save['checksum']]
+    (chunk,) = cs[0]['chunk']
+    mid = (chunk['start'] + chunk['end']) // 2
+    cs[0]['chunk'] = ({'start': chunk['start'], 'end': mid},
+                      {'start': mid, 'end': chunk['end']})
+    monkeypatch.setitem(pokesave.save, 'checksum', tuple(cs))
+    valid = check_batch(batch_saves(5))
+    assert valid.tolist() == [True, False, False, True, True]
+
+
+@pytest.mark.skipif(pokesave.np is None, reason="needs NumPy")
+def test_checksum_batch_short_row():
+    rows = pokesave.np.zeros((2, pokesave.checksum_span() - 1),
+                             dtype=pokesave.np.uint8)
+    with pytest.raises(ValueError):
+        pokesave.checksum_batch(rows)
+    with pytest.raises(ValueError):
+        pokesave.checksum_batch([bytes(pokesave.SAVE_SIZE), bytes(100)])
+
+
+GOLD_OWNED = {19, 41, 74, 92, 155, 156, 201}
+
+
+def test_pokedex_bit_order():
+    # species N is bit N-1, least significant bit of the first byte first
+    assert pokesave.Pokedex.from_species([1]).to_bytes()[0] == 0x01
+    assert pokesave.Pokedex.from_species([9]).to_bytes()[1] == 0x01
+    raw = pokesave.Pokedex.from_species([pokesave.POKEDEX_COUNT]).to_bytes()
+    assert len(raw) == pokesave.POKEDEX_SIZE
+    last = pokesave.POKEDEX_COUNT - 1
+    assert raw[last // 8] == 1 << (last % 8)
+    with pytest.raises(ValueError):
+        pokesave.Pokedex().set(0)
+    with pytest.raises(ValueError):
+        pokesave.Pokedex().set(pokesave.POKEDEX_COUNT + 1)
+
+
+def test_pokedex_round_trip():
+    rng = pokesave.random.Random(5)
+    for _ in range(0, 20):
+        raw = bytes(rng.getrandbits(8) for _ in range(pokesave.POKEDEX_SIZE))
+        dex = pokesave.Pokedex.from_bytes(raw)
+        # bits past the last species mean nothing and don't survive
+        assert pokesave.Pokedex.from_bytes(dex.to_bytes()) == dex
+        assert pokesave.Pokedex.from_species(dex) == dex
+        assert len(dex) == len(list(dex))
+
+
+def test_pokedex_sets():
+    a = pokesave.Pokedex.from_species([1, 4, 7])
+    b = pokesave.Pokedex.from_species([4, 25])
+    assert list(a | b) == [1, 4, 7, 25]
+    assert list(a & b) == [4]
+    assert list(a - b) == [1, 7]
+    assert list(a ^ b) == [1, 7, 25]
+    assert list(a.clear(4)) == [1, 7] and list(a) == [1, 4, 7]
+    assert 25 not in a and 0 not in a
+
+
+def test_pokedex_gold():
+    with open("POKEGOLD.SAV", 'rb') as f:
+        data = f.read()
+    owned = pokesave.Pokedex.from_bytes(
+            pokesave.schema['pokedex_owned'].view(data))
+    seen = pokesave.Pokedex.from_bytes(
+            pokesave.schema['pokedex_seen'].view(data))
+    assert set(owned) == GOLD_OWNED and len(owned) == len(GOLD_OWNED)
+    assert 155 in owned and 152 not in owned
+    assert len(owned - seen) == 0
+
+
+@pytest.mark.skipif(pokesave.np is None, reason="needs NumPy")
+@pytest.mark.parametrize('key', ['pokedex_owned', 'pokedex_seen'])
+def test_pokedex_batch(key):
+    rng = pokesave.random.Random(6)
+    saves = [pokesave.make_fixture(rng) for _ in range(0, 8)]
+    with open("POKEGOLD.SAV", 'rb') as f:
+        saves.append(f.read())
+    counts, frequency = pokesave.pokedex_batch(saves, key)
+    expect = [0] * pokesave.POKEDEX_COUNT
+    for s in saves:
+        for n in pokesave.Pokedex.from_bytes(pokesave.schema[key].view(s)):
+            expect[n - 1] += 1
+    assert counts.tolist() == expect
+    assert frequency.tolist() == [c / len(saves) for c in expect]
+
+
+def test_dex_command(capsys):
+    assert pokesave.main(['dex', '--json', "POKEGOLD.SAV"]) == \
+           pokesave.ERR_NONE
+    out = pokesave.json.loads(capsys.readouterr().out)
+    assert out['saves'] == 1
+    assert {i + 1 for i, c in enumerate(out['counts']) if c} == GOLD_OWNED
+
+
+def test_pokemon_fields():
+    with pokesave.SaveFile("POKEGOLD.SAV") as sf:
+        party = sf.party()
+        assert [(m.species, m.level) for m in party] == [
+                (74, 8), (92, 8), (156, 14), (175, 5)]
+        first = pokesave.schema['pokemon_party'].addr + 1 + \
+                pokesave.PARTY_MAX + 1
+        for i, mon in enumerate(party):
+            at = first + (i * pokesave.POKEMON_SIZE)
+            assert mon.offset == at
+            # each field is where the table says it is
+            assert sf.buf[at + 0x1F] == mon.level
+            assert sf.buf[at] == mon.species
+            assert int.from_bytes(sf.buf[at + 0x08:at + 0x0B], 'big') == \
+                   mon.exp
+            assert tuple(sf.buf[at + 0x02:at + 0x06]) == mon.moves
+            assert mon.unpack() == {name: getattr(mon, name)
+                                    for name, _ in pokesave.Pokemon.fields}
+        assert party[0].ot_id == 3568
+        assert party[2].stats == (42, 26, 26, 30, 32, 28)
+    # the PC only keeps the first BOXMON_SIZE bytes
+    assert not hasattr(pokesave.BoxPokemon, 'stats')
+    assert hasattr(pokesave.Pokemon, 'stats')
+
+
+def test_pokemon_writes_keep_checksums(tmp_path):
+    path = tmp_path / "party.sav"
+    with open("POKEGOLD.SAV", 'rb') as f:
+        path.write_bytes(f.read())
+    with pokesave.SaveFile(str(path), writable=True) as sf:
+        mon = sf.party()[2]
+        mon.level = 15
+        mon.exp = 0x012345
+        mon.moves = (33, 43, 108, 1)
+        assert all(stored == computed for _, stored, computed
+                   in pokesave.checksum_status(sf.buf))
+    with pokesave.SaveFile(str(path)) as sf:
+        mon = sf.party()[2]
+        assert (mon.level, mon.exp, mon.moves) == (15, 0x012345,
+                                                   (33, 43, 108, 1))
+        assert all(stored == computed for _, stored, computed
+                   in pokesave.checksum_status(sf.buf))
+        assert sf.party()[1].level == 8
+
+
+def test_pokemon_in_a_buffer():
+    mem = bytearray(pokesave.POKEMON_SIZE)
+    mon = pokesave.Pokemon(mem)
+    mon.level = 42
+    mon.hp = 0x1234
+    assert mem[0x1F] == 42 and mem[0x22:0x24] == b'\x12\x34'